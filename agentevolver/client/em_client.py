@@ -1,9 +1,12 @@
 import time
 import json
-from typing import List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from loguru import logger
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from agentevolver.schema.trajectory import Trajectory, Reward
 from agentevolver.utils.http_client import HttpClient
@@ -12,6 +15,138 @@ from agentevolver.utils.http_client import HttpClient
 class EMClient(HttpClient):
     base_url: str = Field(default="http://localhost:8001")
     timeout: int = Field(default=1200, description="request timeout, second")
+    retrieve_cache_size: int = Field(default=1024, description="max cached /retrieve_task_memory answers")
+    retrieve_cache_ttl: float = Field(default=60.0, description="cache ttl of a retrieval answer, second; <=0 disables")
+
+    # (query, top_k, workspace_id) -> (stored_at, answer), in LRU order
+    _retrieve_cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    # keys currently being fetched -> event set when the fetch finishes
+    _retrieve_inflight: Dict = PrivateAttr(default_factory=dict)
+    _retrieve_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    # flipped off the first time the server rejects /retrieve_task_memory_batch
+    _batch_route_supported: bool = PrivateAttr(default=True)
+
+    def _cache_lookup(self, key: Tuple[str, int, str]) -> Optional[str]:
+        """
+        Returns a fresh cached retrieval answer and marks it as recently used. Must hold `_retrieve_lock`.
+        """
+        entry = self._retrieve_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, answer = entry
+        if time.monotonic() - stored_at > self.retrieve_cache_ttl:
+            del self._retrieve_cache[key]
+            return None
+        self._retrieve_cache.move_to_end(key)
+        return answer
+
+    def _cache_store(self, key: Tuple[str, int, str], answer: str) -> None:
+        """
+        Stores a retrieval answer, evicting the least recently used ones. Must hold `_retrieve_lock`.
+        """
+        self._retrieve_cache[key] = (time.monotonic(), answer)
+        self._retrieve_cache.move_to_end(key)
+        while len(self._retrieve_cache) > self.retrieve_cache_size:
+            self._retrieve_cache.popitem(last=False)
+
+    def retrieve_task_memory(self, query: str, top_k: int = 1, workspace_id: str = "default") -> Optional[str]:
+        """
+        Calls /retrieve_task_memory through a short-lived LRU cache.
+
+        The rollout_n copies of one task send the same query at almost the same time, so
+        concurrent identical lookups are also collapsed: one thread sends the request and
+        the others wait for its answer.
+
+        Args:
+            query (str): The retrieval query.
+            top_k (int, optional): The number of top results to retrieve. Defaults to 1.
+            workspace_id (str, optional): The ID of the workspace. Defaults to "default".
+
+        Returns:
+            Optional[str]: The merged experience string, or None if the request failed.
+        """
+        json_data = {"query": query, "top_k": top_k, "workspace_id": workspace_id}
+        if self.retrieve_cache_ttl <= 0:
+            response = self.request(json_data=json_data, headers={"Content-Type": "application/json"},
+                                    url=self.base_url + "/retrieve_task_memory")
+            return None if response is None else response["answer"]
+
+        key = (query, top_k, workspace_id)
+        while True:
+            with self._retrieve_lock:
+                answer = self._cache_lookup(key)
+                if answer is not None:
+                    return answer
+                pending = self._retrieve_inflight.get(key)
+                if pending is None:
+                    pending = self._retrieve_inflight[key] = threading.Event()
+                    break
+            # ⭐ Another thread is fetching the same key; reuse its answer (or take over if it failed)
+            pending.wait(self.timeout)
+
+        answer = None
+        try:
+            response = self.request(json_data=json_data, headers={"Content-Type": "application/json"},
+                                    url=self.base_url + "/retrieve_task_memory")
+            if response is not None:
+                answer = response["answer"]
+        finally:
+            with self._retrieve_lock:
+                if answer is not None:
+                    self._cache_store(key, answer)
+                self._retrieve_inflight.pop(key, None)
+            pending.set()
+        return answer
+
+    def retrieve_task_memory_batch(self, queries: List[str], top_k: int = 1, workspace_id: str = "default",
+                                   max_fallback_workers: int = 8) -> List[Optional[str]]:
+        """
+        Retrieves the experience of many queries with one request to /retrieve_task_memory_batch.
+
+        Cached answers are served locally and only the remaining unique queries are sent. Servers
+        without the batch route are handled by falling back to concurrent single retrievals (and
+        the batch route is not tried again by this client).
+
+        Args:
+            queries (List[str]): The retrieval queries, duplicates allowed.
+            top_k (int, optional): The number of top results to retrieve. Defaults to 1.
+            workspace_id (str, optional): The ID of the workspace. Defaults to "default".
+            max_fallback_workers (int, optional): Concurrency of the fallback loop. Defaults to 8.
+
+        Returns:
+            List[Optional[str]]: One answer per query, None where the retrieval failed.
+        """
+        answers: Dict[str, Optional[str]] = {}
+        with self._retrieve_lock:
+            for query in queries:
+                if query not in answers and self.retrieve_cache_ttl > 0:
+                    answers[query] = self._cache_lookup((query, top_k, workspace_id))
+        missing = [q for q in dict.fromkeys(queries) if answers.get(q) is None]
+
+        if missing and self._batch_route_supported:
+            json_data = {"queries": missing, "top_k": top_k, "workspace_id": workspace_id}
+            response = self.request(json_data=json_data, headers={"Content-Type": "application/json"},
+                                    url=self.base_url + "/retrieve_task_memory_batch")
+            batch_answers = response.get("answers") if isinstance(response, dict) else None
+            if isinstance(batch_answers, list) and len(batch_answers) == len(missing):
+                with self._retrieve_lock:
+                    for query, answer in zip(missing, batch_answers):
+                        answers[query] = answer
+                        if answer is not None and self.retrieve_cache_ttl > 0:
+                            self._cache_store((query, top_k, workspace_id), answer)
+                missing = []
+            else:
+                logger.warning("/retrieve_task_memory_batch unavailable, falling back to single retrievals")
+                self._batch_route_supported = False
+
+        if missing:
+            # ⭐ Fallback loop: one /retrieve_task_memory call per unique query
+            with ThreadPoolExecutor(max_workers=max(1, min(max_fallback_workers, len(missing)))) as pool:
+                results = pool.map(lambda q: self.retrieve_task_memory(q, top_k=top_k, workspace_id=workspace_id), missing)
+                for query, answer in zip(missing, results):
+                    answers[query] = answer
+
+        return [answers.get(q) for q in queries]
 
     def call_context_generator(self, trajectory: Trajectory, retrieve_top_k: int = 1, workspace_id: str = "default",
                                **kwargs) -> str:
@@ -28,22 +163,57 @@ class EMClient(HttpClient):
             str: The merged experience string from the server's response.
         """
         start_time = time.time()
-        self.url = self.base_url + "/retrieve_task_memory"  # ⭐ Set the URL for the request
-        json_data = {
-            # "query": trajectory.query,
-            "query": json.dumps(trajectory.steps, ensure_ascii=False),
-            "top_k": retrieve_top_k,
-            "workspace_id": workspace_id,
-            # "metadata": kwargs
-        }
-        response = self.request(json_data=json_data, headers={"Content-Type": "application/json"})  # ⭐ Send the request to the server
-        if response is None:
+        answer = self.retrieve_task_memory(
+            self._context_query(trajectory),
+            top_k=retrieve_top_k,
+            workspace_id=workspace_id,
+        )  # ⭐ Served from the retrieval cache when an identical query was answered recently
+        if answer is None:
             logger.warning("error call_context_generator")
             return ""
 
         # TODO return raw experience instead of context @jinli
         trajectory.metadata["context_time_cost"] = time.time() - start_time  # ⭐ Log the time taken for the operation
-        return response["answer"]  # ⭐ Return the merged experience from the response
+        return answer  # ⭐ Return the merged experience from the response
+
+    def call_context_generator_batch(self, trajectories: List[Trajectory], retrieve_top_k: int = 1,
+                                     workspace_id: str = "default") -> List[str]:
+        """
+        Generates the context of several trajectories with one /retrieve_task_memory_batch request,
+        querying exactly like `call_context_generator`.
+
+        Args:
+            trajectories (List[Trajectory]): The trajectories, each holding its init messages as steps.
+            retrieve_top_k (int, optional): The number of top results to retrieve. Defaults to 1.
+            workspace_id (str, optional): The ID of the workspace. Defaults to "default".
+
+        Returns:
+            List[str]: One merged experience string per trajectory, "" where the retrieval failed.
+        """
+        start_time = time.time()
+        answers = self.retrieve_task_memory_batch(
+            [self._context_query(trajectory) for trajectory in trajectories],
+            top_k=retrieve_top_k,
+            workspace_id=workspace_id,
+        )
+        time_cost = time.time() - start_time
+        results = []
+        for trajectory, answer in zip(trajectories, answers):
+            if answer is None:
+                logger.warning("error call_context_generator_batch")
+                results.append("")
+                continue
+            trajectory.metadata["context_time_cost"] = time_cost
+            results.append(answer)
+        return results
+
+    @staticmethod
+    def _context_query(trajectory: Trajectory) -> str:
+        """
+        The retrieval query of a trajectory: its messages so far (the init messages at rollout start).
+        """
+        # trajectory.query,
+        return json.dumps(trajectory.steps, ensure_ascii=False)
 
     def call_summarizer(self, trajectories: List[Trajectory], workspace_id: str = "default", **kwargs):
         """
@@ -59,13 +229,13 @@ class EMClient(HttpClient):
         """
         start_time = time.time()
 
-        self.url = self.base_url + "/summary_task_memory"  # ⭐ Set the URL for the summarizer endpoint
         json_data = {
             "trajectories": [{"messages": x.steps, "score": x.reward.outcome} for x in trajectories],
             "workspace_id": workspace_id,
             # "metadata": kwargs
         }
-        response = self.request(json_data=json_data, headers={"Content-Type": "application/json"})  # ⭐ Send the request to the server
+        response = self.request(json_data=json_data, headers={"Content-Type": "application/json"},
+                                url=self.base_url + "/summary_task_memory")  # ⭐ Per-call endpoint, no shared self.url
         if response is None:
             logger.warning("error call_summarizer")
             return "", time.time() - start_time
@@ -1,14 +1,60 @@
 # env_client.py
+import threading
 from typing import Dict, List, Any
 
+import aiohttp
 import requests
 from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+_sessions: Dict[tuple, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_shared_session(base_url: str, pool_maxsize: int = 32, max_retries: int = 3) -> requests.Session:
+    """
+    Returns a process-wide keep-alive session for the given env service, creating it on first use.
+
+    Every EnvClient pointing at the same service shares one connection pool, so rollout threads reuse
+    TCP connections instead of opening (and leaving in TIME_WAIT) a new socket per request.
+
+    Args:
+        base_url (str): The base URL of the env service.
+        pool_maxsize (int, optional): Maximum number of pooled connections, usually the number of rollout threads. Defaults to 32.
+        max_retries (int, optional): Retries for failed connection attempts. Defaults to 3.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    key = (base_url, pool_maxsize, max_retries)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # only retry when the request never reached the server, since step/create are not idempotent
+            retry = Retry(total=max_retries, connect=max_retries, read=0, status=0, backoff_factor=0.5)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
 
 
 class EnvClient:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", pool_maxsize: int = 32, max_retries: int = 3):
+        """
+        Initializes the client on top of a shared, pooled HTTP session.
+
+        Args:
+            base_url (str, optional): The base URL of the env service. Defaults to "http://localhost:8000".
+            pool_maxsize (int, optional): Size of the shared connection pool, should match the number of rollout threads. Defaults to 32.
+            max_retries (int, optional): Retries for failed connection attempts. Defaults to 3.
+        """
         self.base_url = base_url.rstrip("/")
         self.timeout = 300.0
+        self.session = get_shared_session(self.base_url, pool_maxsize, max_retries)
 
     def _make_request(
         self,
@@ -44,7 +90,7 @@ class EnvClient:
             **kwargs,
         }
         try:
-            response = requests.post(url, json=data, timeout=self.timeout)  # ⭐ Sends the POST request
+            response = self.session.post(url, json=data, timeout=self.timeout)  # ⭐ Sends the POST request over the pooled session
             response.raise_for_status()
             return response.json()  # ⭐ Parses and returns the JSON response
         except requests.exceptions.RequestException as e:
@@ -138,6 +184,32 @@ class EnvClient:
         )  # ⭐ Sends the request to the environment API
         return response["data"]
 
+    def batch_create_instance(self, requests: List[Dict[str, Any]]) -> List[dict]:
+        """
+        Creates several environment instances with a single request to the API.
+
+        Args:
+            requests (List[Dict[str, Any]]): One dict per instance with `env_type`, `task_id` and optional `instance_id` and `params`.
+
+        Returns:
+            List[dict]: One `{"success", "data"}` entry per instance, in request order.
+        """
+        response = self._make_request(endpoint="batch_create", requests=requests)
+        return response["data"]
+
+    def batch_step(self, requests: List[Dict[str, Any]]) -> List[dict]:
+        """
+        Executes one step in each of several environment instances with a single request to the API.
+
+        Args:
+            requests (List[Dict[str, Any]]): One dict per instance with `instance_id`, the action under `messages` and optional `params`.
+
+        Returns:
+            List[dict]: One `{"success", "data"}` entry per instance, in request order.
+        """
+        response = self._make_request(endpoint="batch_step", requests=requests)
+        return response["data"]
+
     def evaluate(
         self, instance_id: str, messages: Dict = {}, params: Dict = {}
     ) -> float:
@@ -174,6 +246,116 @@ class EnvClient:
         return response["success"]
 
 
+class AsyncEnvClient:
+    def __init__(self, base_url: str = "http://localhost:8000", pool_maxsize: int = 32):
+        """
+        Initializes an asyncio-native env service client.
+
+        All coroutines of one rollout share this client and its aiohttp connection pool, so it must be
+        used (and closed) on a single event loop.
+
+        Args:
+            base_url (str, optional): The base URL of the env service. Defaults to "http://localhost:8000".
+            pool_maxsize (int, optional): Maximum number of concurrent connections. Defaults to 32.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=300.0)
+        self.pool_maxsize = pool_maxsize
+        self._session: aiohttp.ClientSession | None = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # the session has to be created inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def _make_request(
+        self,
+        endpoint: str,
+        env_type: str = "default",
+        task_id: str = None,
+        instance_id: str = None,
+        messages: Dict[str, Any] = None,
+        params: Dict[str, Any] = None,
+        **kwargs,
+    ) -> Dict:
+        """
+        Sends a POST request to the specified API endpoint without blocking the event loop.
+
+        Args:
+            endpoint (str): The API endpoint to send the request to.
+            env_type (str, optional): The type of environment. Defaults to "default".
+            task_id (str, optional): The task ID. Defaults to None.
+            instance_id (str, optional): The instance ID. Defaults to None.
+            messages (Dict[str, Any], optional): Messages to be sent. Defaults to None.
+            params (Dict[str, Any], optional): Additional parameters. Defaults to None.
+
+        Returns:
+            Dict: The JSON response from the API.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        data = {
+            "env_type": env_type,
+            "task_id": task_id,
+            "instance_id": instance_id,
+            "messages": messages or {},
+            "params": params or {},
+            **kwargs,
+        }
+        session = await self._get_session()
+        try:
+            async with session.post(url, json=data) as response:
+                response.raise_for_status()
+                return await response.json()
+        except aiohttp.ClientError as e:
+            logger.error(f"Request failed: {str(e)}, data: {data}")
+            raise
+
+    async def create_instance(
+        self, env_type: str, task_id: str, instance_id: str = None, params: Dict = None
+    ) -> dict:
+        """Async counterpart of `EnvClient.create_instance`."""
+        response = await self._make_request(
+            endpoint="create",
+            env_type=env_type,
+            task_id=task_id,
+            instance_id=instance_id,
+            params=params,
+        )
+        return response["data"]
+
+    async def step(self, instance_id: str, action: Dict = {}, params: Dict = {}) -> dict:
+        """Async counterpart of `EnvClient.step`."""
+        response = await self._make_request(
+            endpoint="step", instance_id=instance_id, messages=action, params=params
+        )
+        return response["data"]
+
+    async def evaluate(
+        self, instance_id: str, messages: Dict = {}, params: Dict = {}
+    ) -> float:
+        """Async counterpart of `EnvClient.evaluate`."""
+        response = await self._make_request(
+            endpoint="evaluate",
+            instance_id=instance_id,
+            messages=messages,
+            params=params,
+        )
+        return response["data"]
+
+    async def release_instance(self, instance_id: str) -> bool:
+        """Async counterpart of `EnvClient.release_instance`."""
+        response = await self._make_request(endpoint="release", instance_id=instance_id)
+        return response["success"]
+
+    async def close(self):
+        """Closes the underlying aiohttp session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
 def main():
     """
     Demonstrates the use of EnvClient by performing a sequence of operations:
@@ -79,6 +79,7 @@ def apply_adca_grpo(
         epoch=f"train.{epoch}.{i}",
         skip_type=getattr(prm_cfg, 'skip_type', "skip_small_adv"),
         model_name=getattr(prm_cfg, 'model_name', "qwen-max"),
+        cache_path=getattr(attribution_cfg, 'judgment_cache_path', None),
     )
 
     # --- PRM evaluation result statistics ---
@@ -3,6 +3,8 @@ import verl.utils.torch_functional as verl_F
 from openai import AsyncOpenAI, RateLimitError, APIError, BadRequestError
 import os
 import json
+import hashlib
+import sqlite3
 from pathlib import Path
 from loguru import logger
 import time
@@ -38,6 +40,7 @@ class EvaluationResult:
     sample_idx: int
     step_results: List[bool]  # Evaluation results for all steps
     response_time: float
+    cacheable: bool = False  # True only when step_results were parsed from a judge answer
 
 @dataclass
 class EvaluationRecord:
@@ -190,6 +193,109 @@ def _save_evaluation_record(record: EvaluationRecord, save_dir: Optional[str] =
         print(f"[record_save] 📁 Path: {save_dir}")
 
 
+class JudgmentCache:
+    """
+    On-disk cache of judge verdicts, keyed by a content hash of the judge model and the exact prompt.
+
+    The prompt already contains the query, the step texts and the overall score, so identical samples
+    (rollout_n duplicates, tasks repeated across epochs) map to the same key. Only verdicts that were
+    actually parsed from a judge answer are stored; fallbacks are never cached.
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens (or creates) the SQLite cache file.
+
+        Args:
+            path (str): Path of the SQLite file.
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judgments (key TEXT PRIMARY KEY, step_results TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, messages: List[Dict]) -> str:
+        """
+        Builds the content hash for one judge request.
+
+        Args:
+            model_name (str): The judge model.
+            messages (List[Dict]): The prompt messages sent to the judge.
+
+        Returns:
+            str: The hex digest used as cache key.
+        """
+        payload = json.dumps([model_name, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[bool]]:
+        """
+        Looks up several keys at once.
+
+        Args:
+            keys (List[str]): Cache keys to look up.
+
+        Returns:
+            Dict[str, List[bool]]: The cached step results of every key that was found.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), 500):  # stay below SQLite's host parameter limit
+                chunk = unique_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, step_results FROM judgments WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+        return found
+
+    def put_many(self, items: Dict[str, List[bool]]):
+        """
+        Stores several verdicts in a single transaction.
+
+        Args:
+            items (Dict[str, List[bool]]): Mapping from cache key to parsed step results.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO judgments (key, step_results, created) VALUES (?, ?, ?)",
+                [(key, json.dumps([bool(x) for x in value]), now) for key, value in items.items()],
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Closes the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def _build_evaluation_messages(task: EvaluationTask, overall_score_source: str) -> List[Dict]:
+    """
+    Builds the judge prompt for a sample.
+
+    Args:
+        task (EvaluationTask): The sample to evaluate.
+        overall_score_source (str): Either "token_level_rewards" or "advantages".
+
+    Returns:
+        List[Dict]: The prompt messages.
+    """
+    if overall_score_source == "token_level_rewards":
+        return build_batch_reward_evaluation_prompt(task.query, task.steps, task.overall_score)
+    elif overall_score_source == "advantages":
+        return build_batch_adv_evaluation_prompt(task.query, task.steps, task.overall_score)
+    raise ValueError(f"Unsupported overall_score_source: {overall_score_source}")
+
+
 async def _async_safe_query(
     client: AsyncOpenAI,
     model: str,
@@ -346,14 +452,7 @@ async def _evaluate_single_sample_api(
 
     try:
         # 1) Construct batch evaluation prompt
-        if overall_score_source == "token_level_rewards":
-            messages = build_batch_reward_evaluation_prompt(
-                task.query, task.steps, task.overall_score
-            )
-        elif overall_score_source == "advantages":
-            messages = build_batch_adv_evaluation_prompt(
-                task.query, task.steps, task.overall_score
-            )
+        messages = _build_evaluation_messages(task, overall_score_source)
 
         # 2) Call the LLM
         llm_raw_output = await _async_safe_query(
@@ -365,6 +464,7 @@ async def _evaluate_single_sample_api(
             step_results = parse_batch_evaluation_result(
                 llm_raw_output, len(task.steps)
             )
+            cacheable = True
             print(
                 f"[API] ✅ Sample {task.sample_idx}: Successfully parsed "
                 f"{len(step_results)} step results"
@@ -377,6 +477,7 @@ async def _evaluate_single_sample_api(
             )
             uniform_flag = get_positive_mask(task.overall_score)
             step_results = [uniform_flag for _ in task.steps]
+            cacheable = False
 
         response_time = time.time() - start_time
 
@@ -409,6 +510,7 @@ async def _evaluate_single_sample_api(
             sample_idx=task.sample_idx,
             step_results=step_results,
             response_time=response_time,
+            cacheable=cacheable,
         )
 
     except Exception as e:
@@ -444,7 +546,7 @@ async def _evaluate_single_sample_api(
             response_time=response_time,
         )
 
-async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: str = "advantages", model_name: str = "qwen-max", evaluation_type: Literal["api"] = "api", max_concurrent: int = 20, batch_size_limit: int = 100, mask_tensor: torch.Tensor = None, api_max_retries: int = 200, save_dir: Optional[str] = None, global_step: Optional[int] = None, epoch: Optional[str] = None, skip_type: str='skip_small_adv') -> Tuple[List[List[bool]], Dict]:
+async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: str = "advantages", model_name: str = "qwen-max", evaluation_type: Literal["api"] = "api", max_concurrent: int = 20, batch_size_limit: int = 100, mask_tensor: torch.Tensor = None, api_max_retries: int = 200, save_dir: Optional[str] = None, global_step: Optional[int] = None, epoch: Optional[str] = None, skip_type: str='skip_small_adv', cache_path: Optional[str] = None) -> Tuple[List[List[bool]], Dict]:
     """
     Evaluates step flags in parallel for a batch of samples, with each sample being evaluated in one API call.
 
@@ -455,13 +557,14 @@ async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: s
         model_name (str, optional): The name of the model being used. Defaults to "qwen-max".
         evaluation_type (Literal["api"], optional): The type of evaluation, currently only "api" is supported. Defaults to "api".
         max_concurrent (int, optional): The maximum number of concurrent API calls. Defaults to 20.
-        batch_size_limit (int, optional): The maximum size of the batch. Defaults to 100.
+        batch_size_limit (int, optional): Unused, kept for backward compatibility; requests are dispatched through a sliding window of `max_concurrent` slots. Defaults to 100.
         mask_tensor (torch.Tensor, optional): An external mask tensor. Defaults to None.
         api_max_retries (int, optional): The maximum number of retries for API calls. Defaults to 200.
         save_dir (Optional[str], optional): The directory to save evaluation records. Defaults to None.
         global_step (Optional[int], optional): The global step in the training process. Defaults to None.
         epoch (Optional[str], optional): The current epoch. Defaults to None.
         skip_type (str, optional): The type of skipping logic to apply. Defaults to 'skip_small_adv'.
+        cache_path (Optional[str], optional): SQLite file of the judgment cache; samples whose prompt was judged before are not sent to the API. Defaults to None (no cache).
 
     Returns:
         Tuple[List[List[bool]], Dict]: A tuple containing the list of step flags for each sample and a dictionary with additional information.
@@ -597,6 +700,34 @@ async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: s
         )
         all_tasks.append(task)
 
+    # ⭐ Serve samples judged before (same model and prompt) from the judgment cache, and send samples sharing
+    # a prompt within this batch (rollout_n / repeated-task duplicates) to the judge only once
+    cache_hits = 0
+    dedup_hits = 0
+    task_cache_keys = {
+        task.sample_idx: JudgmentCache.make_key(model_name, _build_evaluation_messages(task, overall_score_source))
+        for task in all_tasks
+    }
+    judgment_cache = JudgmentCache(cache_path) if cache_path else None
+    cached = judgment_cache.get_many(list(set(task_cache_keys.values()))) if judgment_cache is not None and all_tasks else {}
+    duplicate_samples: Dict[str, List[int]] = {}  # cache key -> samples waiting for the judged sample with that key
+    pending_tasks = []
+    for task in all_tasks:
+        key = task_cache_keys[task.sample_idx]
+        step_results = cached.get(key)
+        if step_results is not None and len(step_results) == len(task.steps):
+            flags_per_sample[task.sample_idx] = step_results
+            cache_hits += 1
+        elif key in duplicate_samples:
+            duplicate_samples[key].append(task.sample_idx)
+            dedup_hits += 1
+        else:
+            duplicate_samples[key] = []
+            pending_tasks.append(task)
+    all_tasks = pending_tasks
+    if judgment_cache is not None or dedup_hits:
+        print(f"[parallel_eval] Judgment cache: {cache_hits} hits, {dedup_hits} in-batch duplicates, {len(all_tasks)} requests ({cache_path})")
+
     total_tasks = len(all_tasks)
     total_api_calls = total_tasks  # Now each sample only needs one API call
     total_steps = sum(len(t.steps) for t in all_tasks)
@@ -612,8 +743,10 @@ async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: s
     print(f"[parallel_eval]   - Skipped {skipped_samples} samples with advantage=0")
 
     if total_tasks == 0:
-        print("[parallel_eval] No tasks to process, all samples had advantage=0")
+        print("[parallel_eval] No tasks to process, all samples were skipped or cached")
         await api_client.close()
+        if judgment_cache is not None:
+            judgment_cache.close()
         return flags_per_sample, {
             "total_tasks": 0,
             "total_api_calls": 0,
@@ -627,34 +760,49 @@ async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: s
             "skipped_samples": skipped_samples,
             "evaluation_type": evaluation_type,
             "api_max_retries": api_max_retries,
-            "efficiency_gain": 0
+            "efficiency_gain": 0,
+            "cache_hits": cache_hits,
+            "dedup_hits": dedup_hits,
         }
 
     all_results = []
     semaphore = asyncio.Semaphore(max_concurrent)
 
-    with tqdm(total=total_tasks, desc=f"[parallel_eval] Processing samples (API)") as pbar:
-        for i in range(0, total_tasks, batch_size_limit):
-            batch_tasks = all_tasks[i:i + batch_size_limit]
-
-            # Each task calls _evaluate_single_sample_api to evaluate all steps of the entire sample at once
-            coroutines = [
-                _evaluate_single_sample_api(api_client, model_name, task, semaphore, overall_score_source, api_max_retries, save_dir, global_step, epoch)
-                for task in batch_tasks
-            ]
-            batch_results = await asyncio.gather(*coroutines, return_exceptions=True)
-
-            for result in batch_results:
-                if isinstance(result, Exception):
-                    print(f"[parallel_eval] ❌ Task failed with exception: {result}")
-                    continue
-                all_results.append(result)
+    # Sliding window: max_concurrent workers pull from one queue, so a new request starts as soon as
+    # any slot frees instead of waiting for the slowest call of a chunk.
+    task_queue: asyncio.Queue = asyncio.Queue()
+    for task in all_tasks:
+        task_queue.put_nowait(task)
 
-            pbar.update(len(batch_tasks))
-
-    # Organize results into flags_per_sample
+    with tqdm(total=total_tasks, desc=f"[parallel_eval] Processing samples (API)") as pbar:
+        async def _worker():
+            while True:
+                try:
+                    task = task_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    # Each task calls _evaluate_single_sample_api to evaluate all steps of the entire sample at once
+                    result = await _evaluate_single_sample_api(api_client, model_name, task, semaphore, overall_score_source, api_max_retries, save_dir, global_step, epoch)
+                    all_results.append(result)
+                except Exception as e:
+                    print(f"[parallel_eval] ❌ Task failed with exception: {e}")
+                finally:
+                    pbar.update(1)
+
+        await asyncio.gather(*(_worker() for _ in range(min(max_concurrent, total_tasks))))
+
+    # Organize results into flags_per_sample; duplicates of a judged sample get a copy of its verdict
     for result in all_results:
         flags_per_sample[result.sample_idx] = result.step_results
+        for sample_idx in duplicate_samples.get(task_cache_keys[result.sample_idx], []):
+            flags_per_sample[sample_idx] = list(result.step_results)
+
+    if judgment_cache is not None:
+        judgment_cache.put_many({
+            task_cache_keys[r.sample_idx]: r.step_results for r in all_results if r.cacheable
+        })
+        judgment_cache.close()
 
     total_time = sum(r.response_time for r in all_results)
     avg_time = total_time / len(all_results) if all_results else 0
@@ -674,6 +822,8 @@ async def evaluate_step_flags_parallel(tokenizer, batch, overall_score_source: s
         "model_name": model_name,
         "api_max_retries": api_max_retries,
         "save_dir": save_dir,
+        "cache_hits": cache_hits,
+        "dedup_hits": dedup_hits,
         "efficiency_gain": total_steps / max(1, len(all_results))  # Efficiency gain multiplier
     }
     def _p95(vals):
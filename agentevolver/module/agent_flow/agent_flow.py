@@ -1,10 +1,11 @@
+import asyncio
 import time
 import os
 
 from loguru import logger
 
 from agentevolver.client.em_client import EMClient
-from agentevolver.client.env_client import EnvClient
+from agentevolver.client.env_client import AsyncEnvClient, EnvClient
 from agentevolver.module.agent_flow.base_agent_flow import BaseAgentFlow
 from agentevolver.utils.utils import convert_tool_to_user_message
 from agentevolver.schema.trajectory import Reward, Trajectory
@@ -22,12 +23,14 @@ log_generate_lock = threading.Lock()
 
 class AgentFlow(BaseAgentFlow):
 
-    def __init__(self, reward_calculator:Optional[RewardCalculator]=None, **kwargs):
+    def __init__(self, reward_calculator:Optional[RewardCalculator]=None, exp_worker:Optional[ExperienceWorker]=None, **kwargs):
         """
         Initializes an instance of the AgentFlow class.
 
         Args:
             reward_calculator (Optional[RewardCalculator]): An optional reward calculator object.
+            exp_worker (Optional[ExperienceWorker]): Experience worker shared by the rollouts of a batch, so their
+                context retrievals can be cached and batched together. A private one is created if omitted.
             **kwargs: Additional keyword arguments passed to the base class.
         """
         super().__init__(**kwargs)  # ⭐ Call the constructor of the base class
@@ -41,7 +44,7 @@ class AgentFlow(BaseAgentFlow):
         # self.experience_template = self.config.hybrid_experience_training.experience_template
         self.cmt: Union[Linear_CMT, LinearThinkCMT] = None
         self.console_debug_mode: bool = self.config.actor_rollout_ref.rollout.debug_llm_io
-        self.exp_worker = ExperienceWorker(config=self.config)
+        self.exp_worker = exp_worker or ExperienceWorker(config=self.config)
 
 
     def execute(self, context_manager, init_messages: List[dict], env: EnvClient, instance_id: str, tmux, stop, thread_index, task_id, traj_exp_config,data_id="", rollout_id="", query="", **kwargs) -> Linear_CMT:
@@ -76,16 +79,9 @@ class AgentFlow(BaseAgentFlow):
                 init_messages=init_messages,
                 traj_exp_config=traj_exp_config
                 )
-        self.cmt.metadata["task_train_exp_mode"] = traj_exp_config.train_mode
-        self.cmt.metadata["add_exp"] = traj_exp_config.add_exp
-        self.cmt.metadata["experience_list"] = traj_exp_config.experience_list
-        # init_messages, metadata = self.add_experience(init_messages, task_id, data_id, rollout_id, query, add_exp)  # ⭐ Initialize messages and metadata
-        # self.cmt.metadata = metadata
-        self.cmt.save_init_input(init_messages, add_nothink)
+        self._save_init_context(init_messages, traj_exp_config, add_nothink)
 
         request_id: str = ""
-        err_in_generating=False
-        err_in_env = False
         for act_step in range(self.max_steps):
             # 2. 🔄 Update thread progress
             tmux['step'][thread_index] = act_step
@@ -93,18 +89,9 @@ class AgentFlow(BaseAgentFlow):
                 self.cmt.discarded = True
                 break
 
-            # 3. ⏮️ get previous steps
-            try:
-                step_input_message_arr = self.cmt.prepare_next_llm_context()  # ⭐ Prepare the next LLM context
-            except Exception as e:
-                print_listofdict(self.cmt.to_role_content(self.cmt.full_context), mod='exception', header="Before Crash")
-                raise e
-
-            # 4. ⚠️ check token overflow
-            is_safe: bool = self.cmt.check_context_token_num_safe(step_input_message_arr)  # ⭐ Check if the context token count is safe
-            if not is_safe:
-                logger.warning(f"Token overflow detected at step {act_step}. Current token count exceeds the limit.")
-                self.cmt.is_terminated = False # trajectory not finished.
+            # 3. ⏮️ get previous steps  4. ⚠️ check token overflow
+            step_input_message_arr = self._prepare_step_input(act_step)
+            if step_input_message_arr is None:
                 break
 
             # 5. 🤖 call llm
@@ -120,38 +107,18 @@ class AgentFlow(BaseAgentFlow):
             # 7. 🌍 world interaction
             try:
                 env_output = env.step(instance_id, {"content": self.cmt.prepare_world_interaction(), "role": "assistant"})  # ⭐ Interact with the environment
-                assert len(env_output['state'])==1
-                env_output["state"] = env_output["state"][0]
-                if env_output["state"]["role"] == "tool":
-                    env_output["state"] = convert_tool_to_user_message(env_output["state"], self.tokenizer, format="qwen")
-                if self.console_debug_mode:
-                    print_listofdict(
-                        step_input_message_arr +
-                        [{'role': 'llm_latest', 'content': llm_output['content']}] +
-                        [{'role': 'env',        'content': env_output["state"]['content']}]
-                    , mod='c')
+                env_output = self._normalize_env_output(env_output, step_input_message_arr, llm_output)
+                err_in_env = False
             except Exception as e:
-                logger.bind(exception=True).exception(f"call env.step error with {e}")
+                env_output = self._env_error_output(e)
                 err_in_env = True
-                self.cmt.is_terminated = False # trajectory not finished.
-                state = {"content": str(e), "role": "user"}
-                env_output = {
-                    "reward": 0,
-                    "is_terminated": True,
-                    "state": state,
-                }
-
-            # 8. 📥 save environment output
-            state = env_output["state"]
-            state.pop('tool_calls', None)
-            self.cmt.save_env_output(state, input_msg_ref=step_input_message_arr, add_nothink=add_nothink)  # ⭐ Save the environment output
-
-            # 9. 🔚 determine if the episode is terminated
-            self.cmt.is_terminated = env_output["is_terminated"]
-            if self.cmt.is_terminated or err_in_env:
+
+            # 8. 📥 save environment output  9. 🔚 determine if the episode is terminated
+            if self._save_env_output(env_output, step_input_message_arr, add_nothink) or err_in_env:
                 break
 
         tmux['step'][thread_index] = -1
+        self.cmt.token_cache.clear()  # rollout finished, drop cached prefix token ids
 
         if self._reward_calculator is not None:
             grader_res = self._reward_calculator.calculate_reward(self.cmt, env, instance_id)  # ⭐ Calculate the reward using the reward calculator
@@ -161,6 +128,199 @@ class AgentFlow(BaseAgentFlow):
             score = env.evaluate(instance_id, params={"sparse": self.sparse})  # ⭐ Evaluate the score from the environment
             reason = "Outcome 1 = success, 0 = failure."
 
+        return self._finalize(score, reason, task_id)
+
+    async def execute_async(self, context_manager, init_messages: List[dict], env: AsyncEnvClient, instance_id: str, tmux, stop, thread_index, task_id, traj_exp_config, data_id="", rollout_id="", query="", sync_env: Optional[EnvClient] = None, **kwargs) -> Linear_CMT:
+        """
+        Coroutine counterpart of `execute`: LLM calls and env requests are awaited on the running event loop
+        instead of blocking a thread. Blocking helpers (experience retrieval, reward calculators) are moved to
+        the default executor so they do not stall the loop.
+
+        Args:
+            context_manager (ContextManager): The context manager for the current task.
+            init_messages (List[dict]): Initial messages for the task.
+            env (AsyncEnvClient): The asyncio environment client.
+            instance_id (str): The ID of the instance.
+            tmux (dict): TMUX dictionary for tracking steps and tokens.
+            stop (list): A list indicating whether to stop the rollout.
+            thread_index (int): The index of the rollout slot.
+            task_id (str): The ID of the task.
+            traj_exp_config (TrajExpConfig): Experience Configuration for the trajectory.
+            data_id (str, optional): The ID of the data. Defaults to "".
+            rollout_id (str, optional): The ID of the rollout. Defaults to "".
+            query (str, optional): The query string. Defaults to "".
+            sync_env (EnvClient, optional): Blocking client handed to reward calculators. Defaults to None.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Linear_CMT: The context manager after the execution.
+        """
+        assert self.async_llm_chat_fn is not None, "execute_async requires async_llm_chat_fn"
+        self.cmt = context_manager
+        add_nothink = self.config.actor_rollout_ref.rollout.use_qwen3
+
+        traj_exp_config.query = query
+        init_messages, traj_exp_config = await asyncio.to_thread(
+            self.exp_worker.manage_rollout_context,
+            init_messages=init_messages,
+            traj_exp_config=traj_exp_config,
+        )
+        self._save_init_context(init_messages, traj_exp_config, add_nothink)
+
+        request_id: str = ""
+        for act_step in range(self.max_steps):
+            tmux['step'][thread_index] = act_step
+            if (stop is not None) and stop[thread_index]:
+                self.cmt.discarded = True
+                break
+
+            step_input_message_arr = self._prepare_step_input(act_step)
+            if step_input_message_arr is None:
+                break
+
+            llm_output = await self.async_llm_chat_fn(step_input_message_arr, request_id=request_id)  # ⭐ Await the LLM directly on the loop
+            if (stop is not None) and stop[thread_index]:
+                self.cmt.discarded = True
+                break
+
+            self.cmt.save_llm_output(llm_output, input_msg_ref=step_input_message_arr)
+            tmux['token'][thread_index] += self.cmt.generated_token_cnt
+
+            try:
+                env_output = await env.step(instance_id, {"content": self.cmt.prepare_world_interaction(), "role": "assistant"})
+                env_output = self._normalize_env_output(env_output, step_input_message_arr, llm_output)
+                err_in_env = False
+            except Exception as e:
+                env_output = self._env_error_output(e)
+                err_in_env = True
+
+            if self._save_env_output(env_output, step_input_message_arr, add_nothink) or err_in_env:
+                break
+
+        tmux['step'][thread_index] = -1
+        self.cmt.token_cache.clear()
+
+        if self._reward_calculator is not None:
+            # graders may call judge LLMs or the blocking env client
+            grader_res = await asyncio.to_thread(self._reward_calculator.calculate_reward, self.cmt, sync_env, instance_id)
+            score = grader_res["score"]
+            reason = grader_res["reason"] or "No reason provided."
+        else:
+            score = await env.evaluate(instance_id, params={"sparse": self.sparse})
+            reason = "Outcome 1 = success, 0 = failure."
+
+        return self._finalize(score, reason, task_id)
+
+    def _save_init_context(self, init_messages: List[dict], traj_exp_config: TrajExpConfig, add_nothink: bool):
+        """
+        Records the experience metadata on the context manager and saves the initial input.
+
+        Args:
+            init_messages (List[dict]): Initial messages, with experience already applied.
+            traj_exp_config (TrajExpConfig): Experience Configuration for the trajectory.
+            add_nothink (bool): Whether to append /no_think for qwen3.
+        """
+        self.cmt.metadata["task_train_exp_mode"] = traj_exp_config.train_mode
+        self.cmt.metadata["add_exp"] = traj_exp_config.add_exp
+        self.cmt.metadata["experience_list"] = traj_exp_config.experience_list
+        self.cmt.save_init_input(init_messages, add_nothink)
+
+    def _prepare_step_input(self, act_step: int) -> Optional[List[dict]]:
+        """
+        Prepares the next LLM context and checks it against the token budget.
+
+        Args:
+            act_step (int): The current step index.
+
+        Returns:
+            Optional[List[dict]]: The LLM input messages, or None when the context would overflow.
+        """
+        try:
+            step_input_message_arr = self.cmt.prepare_next_llm_context()  # ⭐ Prepare the next LLM context
+        except Exception as e:
+            print_listofdict(self.cmt.to_role_content(self.cmt.full_context), mod='exception', header="Before Crash")
+            raise e
+
+        is_safe: bool = self.cmt.check_context_token_num_safe(step_input_message_arr)  # ⭐ Check if the context token count is safe
+        if not is_safe:
+            logger.warning(f"Token overflow detected at step {act_step}. Current token count exceeds the limit.")
+            self.cmt.is_terminated = False # trajectory not finished.
+            return None
+        return step_input_message_arr
+
+    def _normalize_env_output(self, env_output: dict, step_input_message_arr: List[dict], llm_output: dict) -> dict:
+        """
+        Unwraps the single state message returned by the env and converts tool messages into user messages.
+
+        Args:
+            env_output (dict): The raw output of `env.step`.
+            step_input_message_arr (List[dict]): The LLM input of this step, for debug printing.
+            llm_output (dict): The LLM output of this step, for debug printing.
+
+        Returns:
+            dict: The env output with `state` as a single message.
+        """
+        assert len(env_output['state'])==1
+        env_output["state"] = env_output["state"][0]
+        if env_output["state"]["role"] == "tool":
+            env_output["state"] = convert_tool_to_user_message(env_output["state"], self.tokenizer, format="qwen")
+        if self.console_debug_mode:
+            print_listofdict(
+                step_input_message_arr +
+                [{'role': 'llm_latest', 'content': llm_output['content']}] +
+                [{'role': 'env',        'content': env_output["state"]['content']}]
+            , mod='c')
+        return env_output
+
+    def _env_error_output(self, e: Exception) -> dict:
+        """
+        Builds the terminal env output used when `env.step` fails.
+
+        Args:
+            e (Exception): The error raised by the env.
+
+        Returns:
+            dict: A terminated env output carrying the error message.
+        """
+        logger.bind(exception=True).exception(f"call env.step error with {e}")
+        self.cmt.is_terminated = False # trajectory not finished.
+        state = {"content": str(e), "role": "user"}
+        return {
+            "reward": 0,
+            "is_terminated": True,
+            "state": state,
+        }
+
+    def _save_env_output(self, env_output: dict, step_input_message_arr: List[dict], add_nothink: bool) -> bool:
+        """
+        Saves the env output into the context and updates the termination flag.
+
+        Args:
+            env_output (dict): The normalized env output.
+            step_input_message_arr (List[dict]): The LLM input of this step.
+            add_nothink (bool): Whether to append /no_think for qwen3.
+
+        Returns:
+            bool: True if the episode is terminated.
+        """
+        state = env_output["state"]
+        state.pop('tool_calls', None)
+        self.cmt.save_env_output(state, input_msg_ref=step_input_message_arr, add_nothink=add_nothink)  # ⭐ Save the environment output
+        self.cmt.is_terminated = env_output["is_terminated"]
+        return self.cmt.is_terminated
+
+    def _finalize(self, score: float, reason: str, task_id: str) -> Linear_CMT:
+        """
+        Attaches the reward to the context manager and writes the rollout log.
+
+        Args:
+            score (float): The outcome score.
+            reason (str): The explanation of the score.
+            task_id (str): The ID of the task.
+
+        Returns:
+            Linear_CMT: The finished context manager.
+        """
         if score >= 1: success_rate = 1.0
         else: success_rate = 0.0
 
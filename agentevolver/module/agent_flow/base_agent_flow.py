@@ -12,6 +12,7 @@ class BaseAgentFlow(object):
                  llm_chat_fn: Callable,
                  tokenizer: Any,
                  config: DictConfig = None,
+                 async_llm_chat_fn: Callable = None,
                  **kwargs):
         """
         Initializes the BaseAgentFlow with the necessary components.
@@ -20,10 +21,12 @@ class BaseAgentFlow(object):
             llm_chat_fn (Callable): A callable function for LLM chat.
             tokenizer (Any): The tokenizer used for tokenizing text.
             config (DictConfig, optional): Configuration settings. Defaults to None.
+            async_llm_chat_fn (Callable, optional): Coroutine counterpart of `llm_chat_fn`, used by `execute_async`. Defaults to None.
             **kwargs: Additional keyword arguments.
         """
         # super.__init__(**kwargs)
         self.llm_chat_fn: Callable = llm_chat_fn  # ⭐ Store the LLM chat function
+        self.async_llm_chat_fn: Callable = async_llm_chat_fn
         self.tokenizer = tokenizer  # ⭐ Store the tokenizer
         self.config: DictConfig = config  # ⭐ Store the configuration
         self.max_steps: int = self.config.actor_rollout_ref.rollout.multi_turn.max_steps  # ⭐ Set the maximum steps
@@ -44,3 +47,18 @@ class BaseAgentFlow(object):
             Trajectory: The updated trajectory after execution.
         """
         raise NotImplementedError
+
+    async def execute_async(self, trajectory: Trajectory, env: Any, instance_id: str, **kwargs) -> Trajectory:
+        """
+        Coroutine counterpart of `execute`, driven by an asyncio env client and `async_llm_chat_fn`.
+
+        Args:
+            trajectory (Trajectory): The trajectory to be executed.
+            env (AsyncEnvClient): The asyncio environment client.
+            instance_id (str): The ID of the instance.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Trajectory: The updated trajectory after execution.
+        """
+        raise NotImplementedError
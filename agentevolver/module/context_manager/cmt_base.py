@@ -1,5 +1,5 @@
 from agentevolver.schema.trajectory import Reward, Trajectory
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import uuid as uuid_gen
 
 
@@ -295,6 +295,86 @@ class ExtendedMessage:
         return input_id_increment, msg
 
 
+class PrefixTokenCache:
+    """
+    Incremental tokenizer for texts that only grow by appending, such as a chat-templated conversation.
+
+    The token ids of a few recently tokenized texts are kept. When a new text extends one of them, only the
+    appended delta is tokenized. Tokenizers always split special tokens out before running BPE, so the shortcut
+    is exact whenever the cut sits next to a special token (e.g. `<|im_end|>` / `<|im_start|>`); any other cut
+    falls back to tokenizing the full text. Both paths tokenize without the special tokens the tokenizer adds
+    on its own (BOS / EOS); those are wrapped around the result afterwards, as `tokenizer(text)` would.
+    """
+
+    def __init__(self, tokenizer, max_entries: int = 4):
+        """
+        Initializes the cache.
+
+        Args:
+            tokenizer: The tokenizer used to convert text into tokens.
+            max_entries (int, optional): Number of recent texts to keep. Defaults to 4.
+        """
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._entries: List[Tuple[str, List[int]]] = []
+        self._special_tokens = tuple(t for t in getattr(tokenizer, "all_special_tokens", []) if t)
+        self._added_prefix, self._added_suffix = self._probe_added_tokens()
+
+    def _probe_added_tokens(self) -> Tuple[List[int], List[int]]:
+        """
+        Finds the ids the tokenizer adds before and after a text when `add_special_tokens=True`.
+        """
+        probe = "hello"
+        plain = self.tokenizer(probe, add_special_tokens=False)["input_ids"]
+        full = self.tokenizer(probe)["input_ids"]
+        start = find_sublist_indices(full, plain)
+        if not plain or start < 0:
+            return [], []
+        return full[:start], full[start + len(plain):]
+
+    def _is_safe_boundary(self, prefix: str, delta: str) -> bool:
+        """
+        Checks whether tokenizing `prefix` and `delta` separately gives the same ids as tokenizing them together.
+        """
+        if not self._special_tokens:
+            return False
+        return prefix.endswith(self._special_tokens) or delta.startswith(self._special_tokens)
+
+    def encode(self, text: str) -> List[int]:
+        """
+        Tokenizes `text`, reusing the ids of the longest cached prefix when possible.
+
+        Args:
+            text (str): The text to tokenize.
+
+        Returns:
+            List[int]: The token ids, identical to `tokenizer(text)["input_ids"]`.
+        """
+        best_text, best_ids = "", None
+        for cached_text, cached_ids in self._entries:
+            if len(cached_text) > len(best_text) and text.startswith(cached_text):
+                best_text, best_ids = cached_text, cached_ids
+
+        if best_ids is not None and len(best_text) == len(text):
+            input_ids = best_ids
+        elif best_ids is not None and self._is_safe_boundary(best_text, text[len(best_text):]):
+            delta_ids = self.tokenizer(text[len(best_text):], add_special_tokens=False)["input_ids"]  # ⭐ Only tokenize the appended part
+            input_ids = best_ids + delta_ids
+        else:
+            input_ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+        self._entries = [(t, ids) for t, ids in self._entries if t != text]
+        self._entries.insert(0, (text, input_ids))
+        del self._entries[self.max_entries:]
+        return self._added_prefix + input_ids + self._added_suffix
+
+    def clear(self):
+        """
+        Drops all cached prefixes.
+        """
+        self._entries = []
+
+
 def find_sublist_indices(large_list, small_list, reverse=False):
     """
     Finds the starting index of the first occurrence of `small_list` in `large_list`.
@@ -8,7 +8,7 @@ from agentevolver.schema.trajectory import Sample, Reward
 from agentevolver.schema.trajectory import Sample, Trajectory
 from agentevolver.utils.compute_madness import repetition_penalty_reward_scalar
 from agentevolver.module.context_manager.cmt_base import ExtendedMessage, ContextManagerBase
-from agentevolver.module.context_manager.cmt_base import find_sublist_indices, replace_token_ids
+from agentevolver.module.context_manager.cmt_base import find_sublist_indices, replace_token_ids, PrefixTokenCache
 from best_logger import register_logger, print_listofdict, print_dict, print_nested, NestedJsonItem, SeqItem
 from agentevolver.module.exp_manager.exp_manager import ExperienceWorker, TrajExpConfig
 
@@ -48,6 +48,7 @@ class Linear_CMT(Trajectory, ContextManagerBase):
         self.max_seq_length: int = max_model_len - max_response_length  # ⭐ Calculate the maximum sequence length for the context window
         self.max_env_output_length: int = self.config.actor_rollout_ref.rollout.max_env_len
         self.blackout_token_combo = tokenizer.encode("<|im_start|>assistant\n")
+        self.token_cache = PrefixTokenCache(tokenizer)  # ⭐ Reuse token ids of the already templated prefix across steps
         self.generated_token_cnt = 0
 
         self.terminal_rewards_dict = {}
@@ -118,7 +119,7 @@ class Linear_CMT(Trajectory, ContextManagerBase):
         """
         def get_seq_length(messages):
             prompt_text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-            return len(self.tokenizer(prompt_text, return_tensors="pt", padding=False)["input_ids"][0])  # ⭐ Calculate the total number of tokens in the messages
+            return len(self.token_cache.encode(prompt_text))  # ⭐ Calculate the total number of tokens in the messages
         messages = self.prepare_previous_context(mod="raw")
         return get_seq_length(messages) < self.max_seq_length   # self.config.env_engine.max_seq_length = 20480
 
@@ -134,12 +135,8 @@ class Linear_CMT(Trajectory, ContextManagerBase):
         Returns:
             Tuple[List[int], str]: A tuple containing the list of incremental token IDs and a message with token length details.
         """
-        tokenizer_output = self.tokenizer(text_frag_from, return_tensors="pt", padding=False)
-        tokenizer_input_ids = tokenizer_output["input_ids"][0].tolist()
-        token_ids_acc = tokenizer_input_ids
-
-        tokenizer_output = self.tokenizer(text_frag_to, return_tensors="pt", padding=False)
-        input_ids = tokenizer_output["input_ids"][0].tolist()
+        token_ids_acc = self.token_cache.encode(text_frag_from)
+        input_ids = self.token_cache.encode(text_frag_to)
         input_id_increment = input_ids[len(token_ids_acc):]  # ⭐ Get the new tokens added in this step
         overlap_length = 0
         for i in range(len(token_ids_acc)):
@@ -245,8 +242,7 @@ class Linear_CMT(Trajectory, ContextManagerBase):
         token_ids_acc = []
         for llm_msg, ext_msg, index in zip(init_input_arr, self.full_context, range(len(init_input_arr))):
             text_with_chat_template = self.tokenizer.apply_chat_template(init_input_arr[:(index+1)], tokenize=False)
-            tokenizer_output = self.tokenizer(text_with_chat_template, return_tensors="pt", padding=False)
-            input_ids = tokenizer_output["input_ids"][0].tolist()
+            input_ids = self.token_cache.encode(text_with_chat_template)
             # attention_mask = outputs["attention_mask"][0].tolist()
             input_id_increment = input_ids[len(token_ids_acc):]  # get the new tokens added in this step
             overlap_length = 0
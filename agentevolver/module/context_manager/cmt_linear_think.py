@@ -97,7 +97,7 @@ class LinearThinkCMT(Linear_CMT):
             int: The length of the tokenized sequence.
         """
         prompt_text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)  # ⭐ Apply the chat template to the messages
-        return len(self.tokenizer(prompt_text, return_tensors="pt", padding=False)["input_ids"][0])  # ⭐ Tokenize the prompt text and return the length of the tokenized sequence
+        return len(self.token_cache.encode(prompt_text))  # ⭐ Tokenize the prompt text (incrementally) and return the length of the tokenized sequence
 
 
     def check_context_token_num_safe(self, messages: List[dict]) -> bool:
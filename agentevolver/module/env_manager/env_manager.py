@@ -1,3 +1,4 @@
+import asyncio
 import copy
 import time
 import json
@@ -12,12 +13,11 @@ import os
 from loguru import logger
 from omegaconf import DictConfig
 from tensordict import TensorDict
-from torch.nn.utils.rnn import pad_sequence
 from tqdm import tqdm
 from verl import DataProto
 from verl.utils.model import compute_position_id_with_mask
-from verl.utils.torch_functional import (pad_sequence_to_length)
 
+from agentevolver.client.env_client import AsyncEnvClient
 from agentevolver.module.agent_flow.agent_flow import AgentFlow
 from agentevolver.module.agent_flow.base_agent_flow import BaseAgentFlow
 from agentevolver.module.env_manager.env_worker import EnvWorker
@@ -30,7 +30,7 @@ from agentevolver.utils.step_parser import parse_response_ids_to_steps
 # do not delete this line
 from agentevolver.module.task_manager.rewards import LlmAsJudgeRewardCalculator,LlmAsJudgeRewardCalculatorWithGT,LlmAsJudgeBinaryRewardCalculator,LlmAsJudgeBinaryRewardCalculatorWithGT,EnvGrader, AvgBinaryGTJudge, AvgLlmJudge
 from beast_logger import register_logger
-from agentevolver.module.exp_manager.exp_manager import TaskExpConfig, TrajExpConfig
+from agentevolver.module.exp_manager.exp_manager import ExperienceWorker, TaskExpConfig, TrajExpConfig
 
 
 def init_logger(experiment_name):
@@ -80,6 +80,7 @@ class ParallelEnvManager(object):
         self.tokenizer = self.async_rollout_manager.chat_scheduler.completion_callback.tokenizer
         self.pad_token_id = self.tokenizer.pad_token_id
         self.rollout_config = config.actor_rollout_ref.rollout
+        self.exp_worker = ExperienceWorker(config)
 
         # self.experience_template = config.hybrid_experience_training.experience_template
         self.llm_mode = "local" # use fsdp worker ("local") or use foreign server ("remote")
@@ -176,6 +177,67 @@ class ParallelEnvManager(object):
         else:
             return llm_chat
 
+    def get_async_llm_chat_fn(self, sampling_params: dict = None) -> callable:
+        """
+        Returns a coroutine function for chatting with the local rollout servers. It awaits the chat scheduler
+        directly and therefore must run on `chat_scheduler_loop`.
+
+        Args:
+            sampling_params (dict, optional): Default sampling parameters for the chat function.
+
+        Returns:
+            callable: An async function with the same signature as `llm_chat`.
+        """
+
+        async def llm_chat_async(messages: List[Dict[str, str]],
+                                 custom_sampling_params: dict = None,
+                                 request_id: str = None) -> dict:
+            updated_sampling_params = {}
+            if sampling_params:
+                updated_sampling_params.update(sampling_params)
+            if custom_sampling_params:
+                updated_sampling_params.update(custom_sampling_params)
+            updated_sampling_params.update({"logprobs": 1, "return_tokens_as_token_ids": True})
+
+            input_messages = copy.deepcopy(messages)
+            for i in range(self.max_llm_retries):
+                try:
+                    await self.async_rollout_manager.submit_chat_completions_async(messages=input_messages,
+                                                                                   sampling_params=updated_sampling_params,
+                                                                                   request_id=request_id)  # ⭐ Await the scheduler, no thread hop
+                    break
+                except Exception as e:
+                    logger.exception(f"rollout_server.{i} error: {e.args}")
+                    await asyncio.sleep(i + 1)
+
+            return input_messages[-1]
+
+        return llm_chat_async
+
+    def get_sampling_params(self, mode: Literal["sample", "validate"]) -> dict:
+        """
+        Builds the rollout sampling parameters for the given mode.
+
+        Args:
+            mode (Literal["sample", "validate"]): The mode of operation.
+
+        Returns:
+            dict: The sampling parameters.
+        """
+        sampling_params = dict(
+            n=1,
+            max_completion_tokens=self.rollout_config.response_length,
+            temperature=self.rollout_config.temperature,
+            top_p=self.rollout_config.top_p,
+            # chat_template_kwargs={"enable_thinking": False}
+        )
+
+        if mode == "validate":
+            sampling_params["temperature"] = self.rollout_config.val_kwargs.temperature
+            sampling_params["top_k"] = self.rollout_config.val_kwargs.top_k
+            sampling_params["top_p"] = self.rollout_config.val_kwargs.top_p
+        return sampling_params
+
     def step_status_printer(self, tmux):
         """
         Prints the current status of the steps in the parallel environment, including the number of threads in different step ranges and the token generation rate.
@@ -249,18 +311,7 @@ class ParallelEnvManager(object):
         for retry in range(max_retry):
             try:
                 # Prepare sampling parameters
-                sampling_params = dict(
-                    n=1,
-                    max_completion_tokens=self.rollout_config.response_length,
-                    temperature=self.rollout_config.temperature,
-                    top_p=self.rollout_config.top_p,
-                    # chat_template_kwargs={"enable_thinking": False}
-                )
-
-                if mode == "validate":
-                    sampling_params["temperature"] = self.rollout_config.val_kwargs.temperature
-                    sampling_params["top_k"] = self.rollout_config.val_kwargs.top_k
-                    sampling_params["top_p"] = self.rollout_config.val_kwargs.top_p
+                sampling_params = self.get_sampling_params(mode)
 
                 llm_chat_fn = self.get_llm_chat_fn(sampling_params)
                 
@@ -294,6 +345,7 @@ class ParallelEnvManager(object):
                         llm_chat_fn=llm_chat_fn,
                         tokenizer=self.tokenizer,
                         config=self.config,
+                        exp_worker=self.exp_worker,
                         **kwargs
                     )
 
@@ -310,6 +362,159 @@ class ParallelEnvManager(object):
                     raise e
 
 
+    def get_long_tail_target(self, total_rollouts: int, mode: Literal["sample", "validate"]) -> int | None:
+        """
+        Returns how many rollouts must finish before the stragglers are cancelled, or None when the
+        long-tail policy is off. Validation rollouts are never cancelled.
+
+        Args:
+            total_rollouts (int): The number of rollouts in this batch.
+            mode (Literal["sample", "validate"]): The mode of operation.
+
+        Returns:
+            int | None: The number of finished rollouts that triggers cancellation.
+        """
+        long_tail_cfg = self.rollout_config.get("long_tail", None)
+        if mode != "sample" or long_tail_cfg is None or not long_tail_cfg.get("enable", False):
+            return None
+        target = int(np.ceil(long_tail_cfg.get("finish_ratio", 0.95) * total_rollouts))
+        return target if target < total_rollouts else None
+
+    def cancel_long_tail(self, finished: set, total_rollouts: int, stop: list) -> int:
+        """
+        Raises the stop flag of every rollout that has not finished yet. `AgentFlow.execute` checks the
+        flag before and after each LLM call, truncates the episode and marks it as discarded.
+
+        Args:
+            finished (set): Thread indices of the rollouts that already finished.
+            total_rollouts (int): The number of rollouts in this batch.
+            stop (list): List of stop conditions.
+
+        Returns:
+            int: The number of cancelled rollouts.
+        """
+        stragglers = [i for i in range(total_rollouts) if i not in finished]
+        for thread_index in stragglers:
+            stop[thread_index] = True
+        logger.info(f"Long-tail cancellation: {len(finished)}/{total_rollouts} rollouts finished, stopping {len(stragglers)} stragglers")
+        return len(stragglers)
+
+    @staticmethod
+    def mark_long_tail(trajectory: Trajectory) -> Trajectory:
+        """Flags a trajectory that was truncated by the stop list, so `trajectories_to_samples` can drop or tag it."""
+        if getattr(trajectory, "discarded", False):
+            trajectory.metadata["long_tail_cancelled"] = True
+        return trajectory
+
+    async def rollout_env_worker_async(self, task: Task, traj_exp_config: TrajExpConfig, data_id: str, rollout_id: str, mode: Literal["sample", "validate"],
+                                       thread_index: int, tmux: dict, stop: list, async_env: AsyncEnvClient, **kwargs) -> Trajectory:
+        """
+        Coroutine counterpart of `rollout_env_worker` for the standard env worker mode.
+
+        Args:
+            task (Task): The task to be processed.
+            traj_exp_config (TrajExpConfig): Experience Configuration for the trajectory.
+            data_id (str): The ID of the data.
+            rollout_id (str): The ID of the rollout.
+            mode (Literal["sample", "validate"]): The mode of operation, either 'sample' or 'validate'.
+            thread_index (int): The index of the rollout slot.
+            tmux (dict): TMUX configuration.
+            stop (list): List of stop conditions.
+            async_env (AsyncEnvClient): The asyncio env client shared by the rollout loop.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Trajectory: The trajectory generated from the task execution.
+        """
+        max_retry = 4
+        for retry in range(max_retry):
+            try:
+                sampling_params = self.get_sampling_params(mode)
+                reward_caculator = grader_manager.get_calculator(task.evaluator, task=task)
+                agent_flow: BaseAgentFlow = AgentFlow(
+                    reward_calculator=reward_caculator,
+                    llm_chat_fn=self.get_llm_chat_fn(sampling_params),
+                    async_llm_chat_fn=self.get_async_llm_chat_fn(sampling_params),
+                    tokenizer=self.tokenizer,
+                    config=self.config,
+                    exp_worker=self.exp_worker,
+                    **kwargs
+                )
+
+                env_worker = EnvWorker(task=task, thread_index=thread_index, config=self.config, tokenizer=self.tokenizer)
+                trajectory: Trajectory = await env_worker.execute_async(data_id=data_id, rollout_id=rollout_id, traj_exp_config=traj_exp_config,
+                                                                        agent_flow=agent_flow, tmux=tmux, stop=stop, async_env=async_env)
+                return trajectory
+
+            except Exception as e:
+                if retry < max_retry - 1:
+                    logger.bind(exception=True).exception(f"rollout_env_worker_async error: {e.args}, retrying {retry + 1}/{max_retry}")
+                    await asyncio.sleep(2 ** retry)
+                else:
+                    logger.bind(exception=True).exception(f"rollout_env_worker_async failed after {max_retry} retries: {e.args}")
+                    raise e
+
+    async def _rollout_async(self, params_list: list, tmux: dict, stop: list, epoch: str, long_tail_target: int | None = None) -> List[Trajectory]:
+        """
+        Runs every (task, rollout) pair as a coroutine on the chat scheduler loop, at most `max_parallel` at a time,
+        resubmitting failed rollouts like the thread-based engine does.
+
+        Args:
+            params_list (list): One `rollout_env_worker` argument tuple per rollout.
+            tmux (dict): TMUX configuration.
+            stop (list): List of stop conditions.
+            epoch (str): The current epoch identifier, used for the progress bar.
+            long_tail_target (int | None, optional): Finished rollouts after which the rest are cancelled. Defaults to None.
+
+        Returns:
+            List[Trajectory]: The trajectories, in submission order; cancelled rollouts that failed are left out.
+        """
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        finished = set()
+        long_tail_triggered = False
+        async_env = AsyncEnvClient(base_url=self.config.env_service.env_url,
+                                   pool_maxsize=self.config.env_service.get("pool_maxsize", self.max_parallel))
+        pbar = tqdm(total=len(params_list), desc=f"Epoch {epoch}: Collecting rollouts")
+
+        def _reset(thread_index):
+            for k in tmux: tmux[k][thread_index] = 0
+            stop[thread_index] = False
+
+        async def _run(params):
+            nonlocal long_tail_triggered
+            thread_index = params[5]
+            while True:
+                async with semaphore:
+                    try:
+                        result = await self.rollout_env_worker_async(*params, async_env=async_env)
+                    except Exception as e:
+                        if long_tail_triggered and stop[thread_index]:
+                            return None  # cancelled straggler, not worth a retry
+                        logger.error(f"Task {params[1]}-{params[2]} raised an exception: {e}. Retrying... \n Task: {params[0]}")
+                        _reset(thread_index)
+                        continue
+                self.step_status_printer(tmux)
+                if 'error' in result.metadata:
+                    if long_tail_triggered and stop[thread_index]:
+                        return None
+                    logger.warning(f"Task {params[1]}-{params[2]} failed with metadata error: {result.metadata['error']}. Retrying... \n Task: {params[0]}")
+                    await asyncio.sleep(30)
+                    _reset(thread_index)
+                    continue
+                pbar.update(1)
+                finished.add(thread_index)
+                if long_tail_target is not None and not long_tail_triggered and len(finished) >= long_tail_target:
+                    long_tail_triggered = True
+                    self.cancel_long_tail(finished, len(params_list), stop)
+                return self.mark_long_tail(result)
+
+        try:
+            results = await asyncio.gather(*(_run(params) for params in params_list))
+            return [result for result in results if result is not None]
+        finally:
+            pbar.close()
+            await async_env.close()
+
     def rollout(self, tasks: List[Task], task_exp_configs: List[TaskExpConfig], mode: Literal["sample", "validate"], epoch: str) -> List[Trajectory]:
         """
         Executes a list of tasks in a parallel environment using a thread pool, with automatic retries for failed tasks.
@@ -341,6 +546,27 @@ class ParallelEnvManager(object):
         }
         stop = [False for _ in range(len(tasks) * rollout_n)]
 
+        use_async_engine = self.rollout_config.get("async_engine", False) and \
+            self.rollout_config.get("agentscope_workflow", None) is None
+        if use_async_engine:
+            # ⭐ one coroutine per rollout on the chat scheduler loop instead of one thread per rollout
+            params_list = []
+            for data_id, (task, task_exp_config) in enumerate(zip(tasks, task_exp_configs)):
+                for rollout_id in range(rollout_n):
+                    thread_index = data_id * rollout_n + rollout_id
+                    add_exp = task_exp_config.add_exp[rollout_id]
+                    traj_exp_config = TrajExpConfig(
+                        add_exp=add_exp, train_mode=task_exp_config.train_mode,
+                        task_id=task.task_id, data_id=data_id, rollout_id=rollout_id, mode=mode)
+                    params_list.append((task, traj_exp_config, str(data_id), str(rollout_id), mode, thread_index, tmux, stop))
+            future = asyncio.run_coroutine_threadsafe(
+                self._rollout_async(params_list, tmux, stop, epoch,
+                                    long_tail_target=self.get_long_tail_target(len(params_list), mode)),
+                self.async_rollout_manager.chat_scheduler_loop,
+            )
+            traj_cmt_array = future.result()
+            return self._finalize_rollout(traj_cmt_array)
+
         with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
             # 2. submit: submit all tasks to the thread pool
             for data_id, (task, task_exp_config) in enumerate(zip(tasks, task_exp_configs)):
@@ -357,6 +583,10 @@ class ParallelEnvManager(object):
 
             total_rollouts = len(future_to_params)
             pbar = tqdm(total=total_rollouts, desc=f"Epoch {epoch}: Collecting rollouts")
+            # long-tail policy: once enough rollouts finish, the stragglers are stopped instead of gating the step
+            long_tail_target = self.get_long_tail_target(total_rollouts, mode)
+            long_tail_triggered = False
+            finished = set()
 
             # 3. wait for all tasks to complete
             while future_to_params:
@@ -372,6 +602,8 @@ class ParallelEnvManager(object):
 
                         # if the result has metadata error, try to recover
                         if 'error' in result.metadata:
+                            if long_tail_triggered and stop[params[5]]:
+                                continue  # cancelled straggler, not worth a retry
                             error_msg = result.metadata['error']
                             logger.warning(f"Task {params[1]}-{params[2]} failed with metadata error: {error_msg}. Retrying... \n Task: {params[0]}")
                             # as most errors are internet error or quota, we wait before resubmit it
@@ -385,10 +617,16 @@ class ParallelEnvManager(object):
                             continue
 
                         # 5. if the task is successful, add it to the result list
-                        traj_cmt_array.append(result)
+                        traj_cmt_array.append(self.mark_long_tail(result))
                         pbar.update(1) # update progress bar when success
+                        finished.add(params[5])
+                        if long_tail_target is not None and not long_tail_triggered and len(finished) >= long_tail_target:
+                            long_tail_triggered = True
+                            self.cancel_long_tail(finished, total_rollouts, stop)
 
                     except Exception as e:
+                        if long_tail_triggered and stop[params[5]]:
+                            continue  # cancelled straggler, not worth a retry
                         # handle the uncaught exception
                         logger.error(f"Task {params[1]}-{params[2]} raised an exception: {e}. Retrying... \n Task: {params[0]}")
                         # resubmit, and reset tmux and stop
@@ -399,6 +637,18 @@ class ParallelEnvManager(object):
                         future_to_params[new_future] = params
             pbar.close()
 
+        return self._finalize_rollout(traj_cmt_array)
+
+    def _finalize_rollout(self, traj_cmt_array: List[Trajectory]) -> List[Trajectory]:
+        """
+        Attaches the batch success rate to every trajectory and sorts them by (data_id, rollout_id).
+
+        Args:
+            traj_cmt_array (List[Trajectory]): The collected trajectories.
+
+        Returns:
+            List[Trajectory]: The sorted trajectories.
+        """
         task_success_rate = np.mean([cmt.reward.success_rate for cmt in traj_cmt_array])
         for cmt in traj_cmt_array:
             cmt.current_batch_success_rate = np.mean(task_success_rate)
@@ -456,10 +706,20 @@ class ParallelEnvManager(object):
         Returns:
             List[Sample]: A list of samples with extras added and adjusted to be divisible by the world size.
         """
+        # Step 0: drop or tag rollouts truncated by long-tail cancellation (tagged ones are down-weighted by the trainer)
+        long_tail_cfg = self.rollout_config.get("long_tail", None)
+        cancelled_action = long_tail_cfg.get("cancelled_action", "drop") if long_tail_cfg is not None else "drop"
+        num_cancelled = sum(1 for cmt in cmt_array if cmt.metadata.get("long_tail_cancelled", False))
+        if num_cancelled:
+            logger.info(f"{num_cancelled} long-tail cancelled trajectories ({cancelled_action})")
+            if cancelled_action == "drop":
+                cmt_array = [cmt for cmt in cmt_array if not cmt.metadata.get("long_tail_cancelled", False)]
+
         # Step 1: Conversion
         sample_arr_final = []
         for cmt in cmt_array:
             extras = self.get_extra(cmt)
+            extras["long_tail_cancelled"] = cmt.metadata.get("long_tail_cancelled", False)
             # cc: message returned by the new env will be tagged as initialization, with no loss-mask
             sample_arr = cmt.group_tokenize()  # ⭐ Tokenize the trajectory into samples
             for sample in sample_arr:
@@ -490,21 +750,34 @@ class ParallelEnvManager(object):
         Returns:
             DataProto: A DataProto object containing the batched and padded data.
         """
-        # Initialize lists to store batched data
-        step_ids_list  = []
+        batch_size = len(samples)
+        max_prompt_length_this_batch = max(len(sample.prompt_ids) for sample in samples)
+        assert max_prompt_length_this_batch <= self.config.data.max_prompt_length
+        max_response_length_this_batch = max(len(sample.response_ids) for sample in samples)
+        assert max_response_length_this_batch <= self.config.data.max_response_length
+
+        # Preallocate padded (B, max_len) buffers once; each sample is written in by slice assignment.
+        # Prompts are left-padded, responses and step ids are right-padded.
+        prompt_shape = (batch_size, max_prompt_length_this_batch)
+        response_shape = (batch_size, max_response_length_this_batch)
+        prompt_ids_np =            np.full(prompt_shape, self.pad_token_id, dtype=np.int32)
+        prompt_attention_mask_np = np.zeros(prompt_shape, dtype=np.int32)
+        prompt_position_ids_np =   np.zeros(prompt_shape, dtype=np.int32)
+        prompt_loss_mask_np =      np.zeros(prompt_shape, dtype=np.int32)
+        prompt_exp_mask_np =       np.zeros(prompt_shape, dtype=np.int32)  # 1 where off_clip_high applies for the sample, else 0
+        response_ids_np =            np.full(response_shape, self.pad_token_id, dtype=np.int32)
+        response_attention_mask_np = np.zeros(response_shape, dtype=np.int32)
+        response_loss_mask_np =      np.zeros(response_shape, dtype=np.int32)
+        response_exp_mask_np =       np.zeros(response_shape, dtype=np.int32)
+
+        step_ids_list = []
         steps_texts_list = []
-        prompt_ids, response_ids = [], []
-        prompt_attention_mask, response_attention_mask = [], []
-        prompt_position_ids, response_position_ids = [], []
-        prompt_loss_mask, response_loss_mask = [], []
-        prompt_exp_mask_list, response_exp_mask_list = [], []  # List of binary masks indicating whether to consider off_clip_high for each sample in the batch
         messages = []
         reward_scores = []
         task_ids = []
         rollout_ids = []
         extras = [] # List of dictionaries containing supplementary data for each trajectory, including "add_exp", "task_train_expmode", "experience_list"
-        k_text_list = []
-        for sample in samples:
+        for i, sample in enumerate(samples):
             # Validate that all fields have the same length
             assert len(sample.input_ids) == len(sample.attention_mask) == len(sample.position_ids) == len(
                 sample.loss_mask), f"Sample {sample.request_id} has mismatched lengths: " \
@@ -526,33 +799,30 @@ class ParallelEnvManager(object):
                 raise RuntimeError(f"Sample has prompt_ids length {len(sample.prompt_ids)} ")
 
             # ------------- shuchang 0714: append step_ids and steps_texts ------------
-            resp_ids = sample.response_ids
             # shuchang: 0809
             # FIXME: Solve the issue of misaligned step IDs, use the unified step parsing function parse_response_ids_to_steps
             resp_ids = sample.response_ids
             parse_result = parse_response_ids_to_steps(resp_ids, self.tokenizer) # ⭐ Parse the response IDs into step IDs and texts
 
-            step_ids_list.append(torch.tensor(parse_result.step_ids, dtype=torch.long))
+            step_ids_list.append(parse_result.step_ids)
             # generate steps_texts (for semantic evaluation)
             steps_texts_list.append([
                 {"action": s["action_text"], "observation": s["observation_text"]}
                 for s in parse_result.steps
             ])
 
-            # Append tensors to respective lists
+            # Write the sample into the preallocated buffers
             assert len(sample.prompt_ids) != 0
             assert len(sample.response_ids) != 0
-            prompt_ids.append(torch.tensor(sample.prompt_ids, dtype=torch.int))
-            response_ids.append(torch.tensor(sample.response_ids, dtype=torch.int))
-
-            prompt_attention_mask.append(torch.tensor(sample.prompt_attention_mask, dtype=torch.int))
-            response_attention_mask.append(torch.tensor(sample.response_attention_mask, dtype=torch.int))
-
-            prompt_position_ids.append(torch.tensor(sample.prompt_position_ids, dtype=torch.int))
-            response_position_ids.append(torch.tensor(sample.response_position_ids, dtype=torch.int))
-
-            prompt_loss_mask.append(torch.tensor(sample.prompt_loss_mask, dtype=torch.int))
-            response_loss_mask.append(torch.tensor(sample.response_loss_mask, dtype=torch.int))
+            prompt_start = max_prompt_length_this_batch - len(sample.prompt_ids)
+            response_end = len(sample.response_ids)
+            prompt_ids_np[i, prompt_start:] = sample.prompt_ids
+            prompt_attention_mask_np[i, prompt_start:] = sample.prompt_attention_mask
+            prompt_position_ids_np[i, prompt_start:] = sample.prompt_position_ids
+            prompt_loss_mask_np[i, prompt_start:] = sample.prompt_loss_mask
+            response_ids_np[i, :response_end] = sample.response_ids
+            response_attention_mask_np[i, :response_end] = sample.response_attention_mask
+            response_loss_mask_np[i, :response_end] = sample.response_loss_mask
 
             messages.append({"messages": sample.messages})
             reward_scores.append(sample.reward_scores)
@@ -560,57 +830,25 @@ class ParallelEnvManager(object):
 
             # Create experience mask: 1 if off_clip_high conditions met (add_exp=True, task_train_expmode="discard"), else 0
             if sample.extras.get("add_exp", False) and sample.extras.get("task_train_expmode", None)=="discard":
-                prompt_exp_mask_list.append(torch.ones(len(sample.prompt_loss_mask), dtype=torch.int))
-                response_exp_mask_list.append(torch.ones(len(sample.response_loss_mask), dtype=torch.int))
-            else:
-                prompt_exp_mask_list.append(torch.zeros(len(sample.prompt_loss_mask), dtype=torch.int))
-                response_exp_mask_list.append(torch.zeros(len(sample.response_loss_mask), dtype=torch.int))
-
-
-
-        max_prompt_length_this_batch = max([p.shape[-1] for p in prompt_ids])
-        assert max_prompt_length_this_batch <= self.config.data.max_prompt_length
-        max_response_length_this_batch = max([p.shape[-1] for p in response_ids])
-        assert max_response_length_this_batch <= self.config.data.max_response_length
-
-        # Batch and pad sequences
-        # ------------- shuchang 0714: pad step_ids and steps_texts ------------
-        step_ids_pad = pad_sequence(
-            step_ids_list, batch_first=True, padding_value=-1
-        )
-
-        step_ids_pad = pad_sequence_to_length(
-            step_ids_pad, self.config.data.max_response_length, -1
-        )  # ⭐ Pad step IDs to the maximum response length
-        # ------------- shuchang 0714: pad step_ids and steps_texts ------------
-
-
-        prompt_ids =            pad_sequence(prompt_ids, batch_first=True, padding_value=self.pad_token_id, padding_side="left")
-        prompt_attention_mask = pad_sequence(prompt_attention_mask, batch_first=True, padding_value=0, padding_side="left")
-        prompt_position_ids =   pad_sequence(prompt_position_ids, batch_first=True, padding_value=0, padding_side="left")
-        prompt_loss_mask =      pad_sequence(prompt_loss_mask, batch_first=True, padding_value=0, padding_side="left")
-        prompt_exp_mask_list =  pad_sequence(prompt_exp_mask_list, batch_first=True, padding_value=0, padding_side="left")
-
-        prompt_ids =            pad_sequence_to_length(prompt_ids, max_prompt_length_this_batch, self.pad_token_id, left_pad=True)
-        prompt_attention_mask = pad_sequence_to_length(prompt_attention_mask, max_prompt_length_this_batch, 0, left_pad=True)
-        prompt_position_ids =   pad_sequence_to_length(prompt_position_ids, max_prompt_length_this_batch, 0, left_pad=True)
-        prompt_loss_mask =      pad_sequence_to_length(prompt_loss_mask, max_prompt_length_this_batch, 0, left_pad=True)
-        prompt_exp_mask_list =  pad_sequence_to_length(prompt_exp_mask_list, max_prompt_length_this_batch, 0, left_pad=True)
-
-        response_ids =            pad_sequence(response_ids, batch_first=True, padding_value=self.pad_token_id)
-        response_attention_mask = pad_sequence(response_attention_mask, batch_first=True, padding_value=0)
-        response_loss_mask =      pad_sequence(response_loss_mask, batch_first=True, padding_value=0)
-        # response_exp_mask_list =  pad_sequence(response_exp_mask_list, batch_first=True, padding_value=0, padding_side="left")
-        response_exp_mask_list  = pad_sequence(response_exp_mask_list,  batch_first=True, padding_value=0)        # shuchang debug: Remove padding_side="left"
-
-
-        response_ids =            pad_sequence_to_length(response_ids, max_response_length_this_batch, self.pad_token_id)  # ⭐ Pad response IDs to the maximum response length
-        response_attention_mask = pad_sequence_to_length(response_attention_mask, max_response_length_this_batch, 0)  # ⭐ Pad response attention mask to the maximum response length
-        response_loss_mask =      pad_sequence_to_length(response_loss_mask, max_response_length_this_batch, 0)  # ⭐ Pad response loss mask to the maximum response length
-        # response_exp_mask_list =  pad_sequence_to_length(response_exp_mask_list, max_prompt_length_this_batch, 0, left_pad=True)  # ⭐ Pad response experience mask list to the maximum prompt length
-        response_exp_mask_list =  pad_sequence_to_length(response_exp_mask_list, max_response_length_this_batch, 0) # shuchang debug: Should pad to max_response_length_this_batch, not the previous max_prompt_length_this_batch
-
-        delta_position_id = torch.arange(1, response_ids.size(1) + 1, device=response_ids.device).unsqueeze(0).repeat(len(samples), 1)
+                prompt_exp_mask_np[i, prompt_start:] = 1
+                response_exp_mask_np[i, :response_end] = 1
+
+        # ------------- shuchang 0714: pad step_ids to the maximum response length ------------
+        step_ids_width = max(self.config.data.max_response_length, max(len(ids) for ids in step_ids_list))
+        step_ids_np = np.full((batch_size, step_ids_width), -1, dtype=np.int64)
+        for i, ids in enumerate(step_ids_list):
+            step_ids_np[i, :len(ids)] = ids
+        step_ids_pad = torch.from_numpy(step_ids_np)
+
+        prompt_ids =              torch.from_numpy(prompt_ids_np)
+        prompt_attention_mask =   torch.from_numpy(prompt_attention_mask_np)
+        prompt_position_ids =     torch.from_numpy(prompt_position_ids_np)
+        prompt_loss_mask =        torch.from_numpy(prompt_loss_mask_np)
+        response_ids =            torch.from_numpy(response_ids_np)
+        response_attention_mask = torch.from_numpy(response_attention_mask_np)
+        response_loss_mask =      torch.from_numpy(response_loss_mask_np)
+
+        delta_position_id = torch.arange(1, max_response_length_this_batch + 1).unsqueeze(0)
         response_position_ids = prompt_position_ids[:, -1:] + delta_position_id  # ⭐ Calculate the position IDs for the response
 
         # Concatenate prompt and response tensors
@@ -621,7 +859,7 @@ class ParallelEnvManager(object):
         # shuchang: construct group_id
         group_ids = torch.tensor([int(s.data_id) for s in samples], dtype=torch.long)  # ⭐ Construct group IDs from sample data
         # Validate masks have same shape
-        exp_mask = torch.cat((prompt_exp_mask_list, response_exp_mask_list), dim=-1)  # ⭐ Concatenate prompt and response experience masks
+        exp_mask = torch.from_numpy(np.concatenate((prompt_exp_mask_np, response_exp_mask_np), axis=-1))  # ⭐ Concatenate prompt and response experience masks
 
         assert exp_mask.shape == loss_mask.shape, f"Shape mismatch: {exp_mask.shape} vs {loss_mask.shape}"
 
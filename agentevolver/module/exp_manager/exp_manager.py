@@ -1,5 +1,7 @@
 import random
 import re
+import threading
+import time
 from loguru import logger
 from dataclasses import dataclass, field
 from omegaconf import DictConfig
@@ -51,7 +53,10 @@ class ExperienceManager(object):
         self.train_sample_keepratio = self.exp_manager_config.train_sample_keepratio
 
         self.thread_pool = ThreadPoolExecutor(max_workers=self.config.thread_pool.max_workers)
-        self.em_client = EMClient(base_url=self.reme_config.base_url)
+        self.em_client = EMClient(
+            base_url=self.reme_config.base_url,
+            retrieve_cache_ttl=self.reme_config.get("retrieve_cache_ttl", 60.0),
+        )
     
     def summarize_in_batch(self, trajectories: List[Trajectory]) -> None:
         trajectories_sorted = sorted(trajectories, key=lambda traj: traj.task_id)
@@ -224,6 +229,9 @@ class ExperienceWorker(object):
         """
         self.config: DictConfig = config
         self.experience_template = self.config.exp_manager.experience_template
+        # rollouts waiting for the next batched context retrieval
+        self._pending: List[Tuple[Trajectory, Future]] = []
+        self._pending_lock = threading.Lock()
     
     def manage_rollout_context(self, init_messages: List[dict], traj_exp_config: TrajExpConfig) -> Tuple[List[dict], TrajExpConfig]:
         """
@@ -240,9 +248,6 @@ class ExperienceWorker(object):
         if not self._should_process_experience(traj_exp_config):
             return init_messages, traj_exp_config
         
-        # initialize em client
-        self._ensure_em_client()
-        
         # construct trajectory
         trajectory = Trajectory(
             data_id=traj_exp_config.data_id,
@@ -252,12 +257,16 @@ class ExperienceWorker(object):
         )
 
         # retrieve experience
+        self._ensure_em_client()
         reme_config = self.config.exp_manager.reme
-        history_experience = self.em_client.call_context_generator(
-            trajectory=trajectory,
-            retrieve_top_k=reme_config.retrieve_top_k,
-            workspace_id=reme_config.workspace_id
-        )
+        if reme_config.get("batch_retrieve", False):
+            history_experience = self._retrieve_context_batched(trajectory)
+        else:
+            history_experience = self.em_client.call_context_generator(
+                trajectory=trajectory,
+                retrieve_top_k=reme_config.retrieve_top_k,
+                workspace_id=reme_config.workspace_id
+            )
 
         # check empty condition
         if not history_experience:
@@ -273,6 +282,47 @@ class ExperienceWorker(object):
 
         return trajectory.steps, traj_exp_config
     
+    def _retrieve_context_batched(self, trajectory: Trajectory) -> str:
+        """
+        Retrieves the context of a rollout together with the rollouts starting at about the same time.
+
+        The first caller of a window waits `batch_retrieve_wait` seconds and then sends every trajectory queued
+        meanwhile in one `call_context_generator_batch` request; a full window of `batch_retrieve_size` is sent at once.
+
+        Args:
+            trajectory (Trajectory): The trajectory holding the init messages of the rollout.
+
+        Returns:
+            str: The retrieved experience, "" if the retrieval failed.
+        """
+        reme_config = self.config.exp_manager.reme
+        max_batch_size = reme_config.get("batch_retrieve_size", 32)
+        future: Future = Future()
+        batch = None
+        with self._pending_lock:
+            self._pending.append((trajectory, future))
+            is_leader = len(self._pending) == 1
+            if len(self._pending) >= max_batch_size:
+                batch, self._pending = self._pending, []
+        if batch is None and is_leader:
+            time.sleep(reme_config.get("batch_retrieve_wait", 0.05))
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+        if batch:
+            # ⭐ One request answers every rollout queued in this window
+            try:
+                answers = self.em_client.call_context_generator_batch(
+                    [t for t, _ in batch],
+                    retrieve_top_k=reme_config.retrieve_top_k,
+                    workspace_id=reme_config.workspace_id,
+                )
+                for (_, f), answer in zip(batch, answers):
+                    f.set_result(answer)
+            except Exception as e:
+                for _, f in batch:
+                    f.set_exception(e)
+        return future.result()
+
     def _should_process_experience(self, traj_exp_config: TrajExpConfig) -> bool:
         """
         Checks if experience processing should be performed.
@@ -292,7 +342,8 @@ class ExperienceWorker(object):
         """
         if not hasattr(self, 'em_client'):
             self.em_client = EMClient(
-                base_url=self.config.exp_manager.reme.base_url
+                base_url=self.config.exp_manager.reme.base_url,
+                retrieve_cache_ttl=self.config.exp_manager.reme.get("retrieve_cache_ttl", 60.0),
             )
 
 
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from typing import Optional, Sequence
+
+from loguru import logger
+
+from agentevolver.schema.task import TaskObjective
+
+
+class GenerationJournal(object):
+    """
+    Append-only JSONL checkpoint of `TaskManager.generate_task`.
+
+    The first line is a header holding the hash of the seed tasks; every following line records finished
+    explorations and the objectives they contributed:
+
+        {"tasks_hash": "...", "total_items": 120, "created": 1700000000.0}
+        {"items": [3], "objectives": [{...TaskObjective...}, ...]}
+
+    Each checkpoint only appends the new records, and a record torn by a crash is dropped on resume.
+    """
+
+    def __init__(self, path: str, tasks_hash: str, total_items: int):
+        """
+        Initializes the journal. Nothing is read or written until `load` is called.
+
+        Args:
+            path (str): The path of the journal file.
+            tasks_hash (str): Hash of the seed tasks, as computed by `TaskManager._compute_tasks_hash`.
+            total_items (int): Number of explorations of the whole run, recorded in the header.
+        """
+        self._path = path
+        self._tasks_hash = tasks_hash
+        self._total_items = total_items
+        self._file = None
+
+    def load(self, legacy_batch_size: Optional[int] = None, legacy_path: Optional[str] = None) -> tuple[set[int], list[TaskObjective]]:
+        """
+        Replays the journal and opens it for appending. A missing, unreadable or mismatching journal is started afresh.
+
+        Args:
+            legacy_batch_size (Optional[int]): Batch size used to expand the batch indices of old single-JSON checkpoints.
+            legacy_path (Optional[str]): Old single-JSON checkpoint converted into the journal when the journal does not exist yet.
+
+        Returns:
+            tuple[set[int], list[TaskObjective]]: The finished exploration items and the recorded objectives.
+        """
+        processed_items: set[int] = set()
+        objectives: list[TaskObjective] = []
+        if not os.path.exists(self._path):
+            if legacy_path is not None and os.path.exists(legacy_path):
+                try:
+                    return self._load_legacy(legacy_batch_size, legacy_path)
+                except Exception as e:
+                    logger.warning(f"Failed to convert checkpoint {legacy_path}: {e}, starting from scratch")
+            self._start()
+            return processed_items, objectives
+
+        try:
+            with open(self._path, "rb") as f:
+                first_line = f.readline()
+                try:
+                    header = json.loads(first_line)
+                except json.JSONDecodeError:
+                    header = None
+                if not isinstance(header, dict) or "results" in header or "tasks_hash" not in header:
+                    return self._load_legacy(legacy_batch_size, self._path)
+                if header["tasks_hash"] != self._tasks_hash:
+                    logger.warning(f"Tasks hash mismatch. Expected: {self._tasks_hash}, got: {header['tasks_hash']}. Removing checkpoint.")
+                    self._start()
+                    return processed_items, objectives
+
+                valid_end = f.tell()
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        record = json.loads(line)
+                        record_objectives = [TaskObjective.parse_obj(obj) for obj in record["objectives"]]
+                        record_items = [int(i) for i in record["items"]]
+                    except Exception:
+                        logger.warning(f"Dropping torn checkpoint record at byte {valid_end} of {self._path}")
+                        break
+                    objectives.extend(record_objectives)
+                    processed_items.update(record_items)
+                    valid_end += len(line)
+        except Exception as e:
+            logger.warning(f"Failed to load checkpoint: {e}, starting from scratch")
+            self._start()
+            return set(), []
+
+        # cut off a partially written last record so new records start on a fresh line
+        with open(self._path, "r+b") as f:
+            f.truncate(valid_end)
+        self._file = open(self._path, "a", encoding="utf-8")
+        logger.info(f"Resumed from checkpoint: {len(objectives)} results loaded, {len(processed_items)} explorations processed")
+        return processed_items, objectives
+
+    def append(self, items: Sequence[int], objectives: Sequence[TaskObjective]):
+        """
+        Appends one record and flushes it.
+
+        Args:
+            items (Sequence[int]): The finished exploration items.
+            objectives (Sequence[TaskObjective]): The objectives they contributed.
+        """
+        assert self._file is not None, "journal is not loaded"
+        record = {"items": list(items), "objectives": [obj.dict() for obj in objectives]}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _start(self):
+        """
+        Creates a new journal holding only the header.
+        """
+        self.close()
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            header = {"tasks_hash": self._tasks_hash, "total_items": self._total_items, "created": time.time()}
+            f.write(json.dumps(header) + "\n")
+        os.replace(tmp_path, self._path)
+        self._file = open(self._path, "a", encoding="utf-8")
+
+    def _load_legacy(self, legacy_batch_size: Optional[int], path: str) -> tuple[set[int], list[TaskObjective]]:
+        """
+        Converts the old single-JSON checkpoint at `path` into a journal.
+        """
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("tasks_hash") != self._tasks_hash:
+            logger.warning(f"Tasks hash mismatch. Expected: {self._tasks_hash}, got: {checkpoint.get('tasks_hash')}. Removing checkpoint.")
+            self._start()
+            return set(), []
+
+        objectives = [TaskObjective.parse_obj(obj) for obj in checkpoint.get("results", [])]
+        if "processed_items" in checkpoint:
+            processed_items = {int(i) for i in checkpoint["processed_items"]}
+        else:
+            # the oldest checkpoints record whole batches of legacy_batch_size items
+            assert legacy_batch_size, "legacy_batch_size is required to convert batch checkpoints"
+            processed_items = set()
+            for b in checkpoint.get("processed_indices", []):
+                processed_items.update(range(int(b) * legacy_batch_size, min((int(b) + 1) * legacy_batch_size, self._total_items)))
+
+        self._start()
+        self.append(sorted(processed_items), objectives)
+        logger.info(f"Converted checkpoint {path} to the journal {self._path}: {len(objectives)} results, {len(processed_items)} explorations processed")
+        return processed_items, objectives
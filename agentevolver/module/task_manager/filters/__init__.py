@@ -18,6 +18,29 @@ class TaskPostFilter(abc.ABC):
         """
         pass
 
+    def filter_new(self, tasks: Sequence[TaskObjective]) -> list[TaskObjective]:
+        """
+        Filters newly produced TaskObjective objects against the ones this filter accepted since the last `reset`,
+        so streaming callers only push new objectives through the filter.
+
+        Stateless filters can keep this default, which filters the new objectives on their own.
+        Accepted objectives are final: of two near-duplicates from different calls the earlier one is kept,
+        even if the later one has a higher confidence.
+
+        Args:
+            tasks (Sequence[TaskObjective]): The newly produced TaskObjective objects.
+
+        Returns:
+            list[TaskObjective]: The accepted subset of `tasks`.
+        """
+        return self.filter(tasks)
+
+    def reset(self):
+        """
+        Forgets the objectives accepted by `filter_new`.
+        """
+        pass
+
 
 from .filters import NaiveTaskPostFilter
 
@@ -1,11 +1,102 @@
 import abc
+import zlib
 from typing import Sequence
 
+import numpy as np
+
 from agentevolver.module.task_manager.filters import TaskPostFilter
 from agentevolver.schema.task import TaskObjective
 
 
+class MinHashLSHIndex:
+    """
+    MinHash signatures of word sets, bucketed by LSH bands.
+
+    A query only returns the indexed sets sharing at least one band with it, so callers verify those few
+    candidates with the exact Jaccard similarity instead of comparing against everything indexed.
+    A pair with Jaccard similarity J becomes a candidate with probability 1 - (1 - J^rows)^bands;
+    `for_threshold` picks the bands so that this stays above 1 - 1e-6 at the dedup threshold
+    (e.g. 32 bands of 4 rows at 0.8, 64 bands of 2 rows at 0.5).
+    """
+
+    _PRIME = np.uint64(4294967311)  # smallest prime above 2^32, so (a * x + b) never overflows uint64
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, seed: int = 1):
+        """
+        Initializes an empty index.
+
+        Args:
+            num_perm (int): Number of hash permutations of a signature.
+            bands (int): Number of LSH bands; must divide `num_perm`.
+            seed (int): Seed of the permutation parameters.
+        """
+        assert num_perm % bands == 0, "bands must divide num_perm"
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+        self._bands = bands
+        self._rows = num_perm // bands
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self.items: list[frozenset[str]] = []
+
+    @classmethod
+    def for_threshold(cls, threshold: float, num_perm: int = 128, max_miss: float = 1e-6) -> "MinHashLSHIndex":
+        """
+        Creates an index with the fewest bands that still misses a pair at `threshold` with probability below `max_miss`.
+
+        Args:
+            threshold (float): Jaccard similarity at which pairs must be found, in (0, 1].
+            num_perm (int): Number of hash permutations of a signature.
+            max_miss (float): Tolerated probability of missing a pair at `threshold`.
+        """
+        assert 0 < threshold <= 1, "threshold must be in (0, 1]"
+        bands = num_perm  # one row per band finds the most pairs
+        for rows in range(num_perm, 0, -1):
+            if num_perm % rows == 0 and (1 - threshold ** rows) ** (num_perm // rows) <= max_miss:
+                bands = num_perm // rows
+                break
+        return cls(num_perm=num_perm, bands=bands)
+
+    def signature(self, words: frozenset[str]) -> np.ndarray:
+        """
+        Computes the MinHash signature of a non-empty word set.
+        """
+        xs = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+        return ((np.outer(xs, self._a) + self._b) % self._PRIME).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[i * self._rows:(i + 1) * self._rows].tobytes() for i in range(self._bands)]
+
+    def candidates(self, signature: np.ndarray) -> set[int]:
+        """
+        Returns the indices of indexed sets sharing at least one band with `signature`.
+        """
+        found: set[int] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self._buckets[band].get(key, ()))
+        return found
+
+    def add(self, words: frozenset[str], signature: np.ndarray) -> int:
+        """
+        Indexes a word set under its signature and returns its index.
+        """
+        idx = len(self.items)
+        self.items.append(words)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(idx)
+        return idx
+
+
 class NaiveTaskPostFilter(TaskPostFilter):
+    def __init__(self, threshold: float = 0.8):
+        """
+        Args:
+            threshold (float, optional): Word-level Jaccard similarity at which two queries are duplicates. Defaults to 0.8.
+        """
+        self._threshold = threshold
+        # word sets accepted by filter_new since the last reset
+        self._seen_index = MinHashLSHIndex.for_threshold(threshold)
+
     def filter(self, tasks: Sequence[TaskObjective]) -> list[TaskObjective]:
         """
         Sorts and filters a list of tasks based on their confidence and removes duplicates by comparing the similarity of their query texts.
@@ -16,53 +107,58 @@ class NaiveTaskPostFilter(TaskPostFilter):
         Returns:
             list[TaskObjective]: A list of unique and high-confidence TaskObjective objects.
         """
-        tasks = list(tasks)
-        tasks.sort(key=lambda x: x.confidence or 0, reverse=True)  # ⭐ Sort tasks by confidence in descending order
-
-        unique_tasks = []
-        seen_queries = set()
-
-        for i, task in enumerate(tasks):
-            query = task.objective
-            assert query is not None
-            normalized_query = (
-                query.lower().strip()
-            )  # FIXME: this only supports English
-
-            is_duplicate = False
-            for seen_query in seen_queries:
-                if self._check_similarity(normalized_query, seen_query):
-                    is_duplicate = True
-                    break
+        return self._filter_into(tasks, MinHashLSHIndex.for_threshold(self._threshold))
 
-            if task.ground_truth != "" and not is_duplicate:
-                unique_tasks.append(task)  # ⭐ Add task to unique_tasks if it is not a duplicate and has a non-empty ground truth
-                seen_queries.add(normalized_query)
-
-        return unique_tasks
-
-    def _check_similarity(
-        self, query1: str, query2: str, threshold: float = 0.8
-    ) -> bool:
+    def filter_new(self, tasks: Sequence[TaskObjective]) -> list[TaskObjective]:
         """
-        Checks the similarity between two queries based on the overlap of their words.
+        Filters newly produced tasks against the queries accepted so far, keeping the accepted queries across calls.
+        Confidence only orders the tasks of one call; a duplicate of an earlier accepted query is dropped whatever its confidence.
 
         Args:
-            query1 (str): The first query string.
-            query2 (str): The second query string.
-            threshold (float, optional): The similarity threshold. Defaults to 0.8.
+            tasks (Sequence[TaskObjective]): The newly produced TaskObjective objects.
 
         Returns:
-            bool: True if the similarity is above the threshold, False otherwise.
+            list[TaskObjective]: The new tasks that are neither duplicates nor missing a ground truth.
         """
-        words1 = set(query1.split())
-        words2 = set(query2.split())
+        return self._filter_into(tasks, self._seen_index)
 
-        if not words1 or not words2:
-            return False
+    def reset(self):
+        self._seen_index = MinHashLSHIndex.for_threshold(self._threshold)
+
+    def _filter_into(self, tasks: Sequence[TaskObjective], index: MinHashLSHIndex) -> list[TaskObjective]:
+        """
+        Accepts tasks in descending confidence order unless they have no ground truth or duplicate a query in `index`;
+        accepted queries are added to `index`.
+        """
+        tasks = sorted(tasks, key=lambda x: x.confidence or 0, reverse=True)  # ⭐ Sort tasks by confidence in descending order
 
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+        unique_tasks = []
+        for task in tasks:
+            query = task.objective
+            assert query is not None
+            normalized_query = query.lower().strip()  # FIXME: this only supports English
+            if task.ground_truth == "":
+                continue
+
+            words = frozenset(normalized_query.split())
+            if not words:
+                # an empty query is never similar to anything
+                unique_tasks.append(task)
+                continue
+
+            # ⭐ Only the LSH bucket neighbours are checked with the exact Jaccard similarity
+            signature = index.signature(words)
+            is_duplicate = any(
+                self._jaccard(words, index.items[i]) >= self._threshold
+                for i in index.candidates(signature)
+            )
+            if not is_duplicate:
+                unique_tasks.append(task)
+                index.add(words, signature)
+
+        return unique_tasks
 
-        similarity = len(intersection) / len(union) if union else 0  # ⭐ Calculate the similarity score
-        return similarity >= threshold  # ⭐ Compare the similarity with the threshold
+    @staticmethod
+    def _jaccard(words1: frozenset[str], words2: frozenset[str]) -> float:
+        union = len(words1 | words2)
+        return len(words1 & words2) / union if union else 0
@@ -1,7 +1,14 @@
+import hashlib
 import os
+import sqlite3
+import threading
+import time
 import uuid
-from typing import Any, Optional, Sequence
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from loguru import logger
 
@@ -10,15 +17,222 @@ from agentevolver.schema.trajectory import Trajectory
 
 MAX_INPUT_LEN=8192
 
+
+class EmbeddingCache:
+    """
+    Content-hash keyed embedding cache: an in-memory LRU in front of an on-disk SQLite store.
+
+    Keys are sha256(model, text), so an identical text is embedded once, across threads and across runs
+    sharing the same store. Vectors are stored on disk as float32.
+    """
+
+    def __init__(self, path: Optional[str], model: str, max_memory_items: int = 4096):
+        """
+        Args:
+            path (Optional[str]): SQLite file of the persistent store; None keeps the cache in memory only.
+            model (str): Embedding model name, part of every key.
+            max_memory_items (int): Capacity of the in-memory LRU.
+        """
+        self._model = model
+        self._max_memory_items = max_memory_items
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self._model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> list[Optional[list[float]]]:
+        """
+        Looks up the embeddings of texts, in memory first and then on disk.
+
+        Returns:
+            list[Optional[list[float]]]: One embedding per text, None for misses.
+        """
+        keys = [self.key(text) for text in texts]
+        out: list[Optional[list[float]]] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    out[i] = vector
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._conn is not None:
+                pending = list(missing)
+                for start in range(0, len(pending), 500):  # stay below the SQLite variable limit
+                    chunk = pending[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                        self._remember(key, vector)
+                        for i in missing[key]:
+                            out[i] = vector
+
+            n_hits = sum(1 for vector in out if vector is not None)
+            self.hits += n_hits
+            self.misses += len(out) - n_hits
+        return out
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """
+        Stores the embeddings of texts in memory and on disk.
+        """
+        with self._lock:
+            rows = []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                self._remember(key, list(vector))
+                rows.append((key, np.asarray(vector, dtype=np.float32).tobytes()))
+            if self._conn is not None and rows:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._conn.commit()
+
+    def _remember(self, key: str, vector: list[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._max_memory_items:
+            self._lru.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches embedding requests of concurrent callers.
+
+    Texts submitted from any thread are queued; a dispatcher thread flushes the queue once it holds
+    `max_batch_size` texts or the oldest text has waited `max_wait` seconds, sends the batch as one
+    request and resolves the futures of every caller waiting on it.
+    """
+
+    def __init__(self, embed_fn: Callable[[list[str]], list[list[float]]], max_batch_size: int = 10,
+                 max_wait: float = 0.01, max_inflight: int = 4):
+        """
+        Args:
+            embed_fn (Callable[[list[str]], list[list[float]]]): Embeds a batch of texts with one request.
+            max_batch_size (int): Maximum number of texts of one request.
+            max_wait (float): Seconds the oldest queued text waits for others to join its batch.
+            max_inflight (int): Maximum number of concurrent requests.
+        """
+        self._embed_fn = embed_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue: OrderedDict[str, list[Future]] = OrderedDict()
+        self._arrival: dict[str, float] = {}  # when each queued text first arrived, in queue order
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embedding-batch")
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="embedding-batcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, texts: Sequence[str]) -> list[Future]:
+        """
+        Queues texts for embedding. Identical queued texts share one slot of the batch.
+
+        Returns:
+            list[Future]: One future per text, resolving to its embedding.
+        """
+        futures = [Future() for _ in texts]
+        if not futures:
+            return futures
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            now = time.monotonic()
+            for text, future in zip(texts, futures):
+                if text not in self._queue:
+                    self._queue[text] = []
+                    self._arrival[text] = now
+                self._queue[text].append(future)
+            self._cond.notify()
+        return futures
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # ⭐ Wait for the batch to fill up, but never longer than max_wait after the oldest text arrived
+                while len(self._queue) < self._max_batch_size and not self._closed:
+                    oldest = self._arrival[next(iter(self._queue))]
+                    remaining = oldest + self._max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popitem(last=False) for _ in range(min(self._max_batch_size, len(self._queue)))]
+                for text, _ in batch:
+                    del self._arrival[text]
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: list[tuple[str, list[Future]]]):
+        try:
+            vectors = self._embed_fn([text for text, _ in batch])
+            assert len(vectors) == len(batch), f"expected {len(batch)} embeddings, got {len(vectors)}"
+        except Exception as e:
+            logger.error(f"Batched embedding request of {len(batch)} texts failed: {e}")
+            for _, futures in batch:
+                for future in futures:
+                    future.set_exception(e)
+            return
+        for (_, futures), vector in zip(batch, vectors):
+            for future in futures:
+                future.set_result(vector)
+
+    def close(self):
+        """
+        Flushes the queued texts and stops the dispatcher.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+
 class EmbeddingClient:
     def __init__(self, similarity_threshold: float, base_url: str = 'https://dashscope.aliyuncs.com/compatible-mode/v1', 
                  api_key: Optional[str] = None, model: str = "text-embedding-v4",
-                 chroma_db_path: str = "./chroma_db", collection_name: str = "trajectories"):
+                 chroma_db_path: str = "./chroma_db", collection_name: str = "trajectories",
+                 embedding_cache_path: Optional[str] = None, embedding_cache_size: int = 4096,
+                 embedding_batch_size: int = 10, embedding_batch_wait: float = 0.01):
         api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         assert api_key is not None, "DASHSCOPE_API_KEY is required"
         
         self._client = OpenAIEmbeddingClient(api_key=api_key, base_url=base_url, model_name=model)
         self.similarity_threshold = similarity_threshold
+        # identical texts (e.g. the same state revisited by several rollouts) are embedded only once
+        self._cache = EmbeddingCache(
+            embedding_cache_path or os.path.join(chroma_db_path, "embedding_cache.sqlite"),
+            model=model,
+            max_memory_items=embedding_cache_size,
+        )
+        # concurrent add/find calls from exploration threads share batched requests
+        # (the dispatcher must not reference self, so an unused client can still be collected)
+        openai_client = self._client
+        self._batcher = EmbeddingBatcher(
+            lambda texts: openai_client.get_multiple_embeddings(texts),
+            max_batch_size=embedding_batch_size,
+            max_wait=embedding_batch_wait,
+        )
         
         self._chroma_client = chromadb.PersistentClient(
             path=chroma_db_path,
@@ -37,7 +251,7 @@ class EmbeddingClient:
         """
         Add text and ID to ChromaDB
         """
-        embedding = self._client.get_single_embedding(text)
+        embedding = self._get_embedding(text)
         
         chroma_id = f"doc_{id}_{uuid.uuid4().hex[:8]}"
         
@@ -58,7 +272,7 @@ class EmbeddingClient:
         if self._collection.count() == 0:
             return None
         
-        query_embedding = self._client.get_single_embedding(text)
+        query_embedding = self._get_embedding(text)
         
         results = self._collection.query(
             query_embeddings=[query_embedding],
@@ -85,7 +299,7 @@ class EmbeddingClient:
         if self._collection.count() == 0:
             return []
         
-        query_embedding = self._client.get_single_embedding(text)
+        query_embedding = self._get_embedding(text)
         
         results = self._collection.query(
             query_embeddings=[query_embedding],
@@ -108,15 +322,30 @@ class EmbeddingClient:
         
         return result_list
     
+    def _get_embedding(self, text: str) -> list[float]:
+        """
+        Get the embedding of a single text, through the cache
+        """
+        return self._embedding([text])[0]
+
     def _embedding(self, texts: Sequence[str], bs=10) -> list[list[float]]:
         """
-        Get the embedding of texts
+        Get the embedding of texts, only requesting the ones missing from the cache.
+
+        The misses go through the micro-batcher, which sizes the requests by `embedding_batch_size`;
+        `bs` is kept for compatibility.
         """
-        res: list[list[float]] = []
-        for i in range(0, len(texts), bs):
-            res.extend(self._client.get_multiple_embeddings(texts[i:i+bs]))
+        res = self._cache.get_many(texts)
+        missing = [i for i, vector in enumerate(res) if vector is None]
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = [future.result() for future in self._batcher.submit(unique_texts)]
+            self._cache.put_many(unique_texts, vectors)
+            fetched = dict(zip(unique_texts, vectors))
+            for i in missing:
+                res[i] = fetched[texts[i]]
         
-        return res
+        return res # type: ignore
     
     def get_all_stored_texts(self) -> dict[int, str]:
         """
@@ -165,6 +394,11 @@ class EmbeddingClient:
         except Exception as e:
             print(f"failed to clear stores: {e}")
     
+    def close(self):
+        """stop the request batcher and close the embedding cache"""
+        self._batcher.close()
+        self._cache.close()
+
     def size(self) -> int:
         """get the number of stored texts"""
         return self._collection.count()
@@ -196,11 +430,13 @@ def pack_trajectory(trajectory: Trajectory) -> str:
 
 
 class StateRecorder:
-    def __init__(self, similarity_threshold: float, chroma_db_path: str = "./chroma_db", collection_name: str = "trajectories"):
+    def __init__(self, similarity_threshold: float, chroma_db_path: str = "./chroma_db", collection_name: str = "trajectories",
+                 embedding_cache_path: Optional[str] = None):
         self._client = EmbeddingClient(
             similarity_threshold=similarity_threshold,
             chroma_db_path=chroma_db_path,
-            collection_name=collection_name
+            collection_name=collection_name,
+            embedding_cache_path=embedding_cache_path,
         )
         
         self._mp: dict[int, list[tuple[str, str]]] = {}
@@ -271,6 +507,16 @@ class StateRecorder:
         self._client.clear()
         self._idx = 0
 
+    def close(self):
+        """release the batcher thread and the embedding cache of the underlying client"""
+        self._client.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
 
 # demo
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import copy
 import functools
 import hashlib
@@ -7,7 +8,6 @@ import os
 import pickle
 import random
 import threading
-import time
 from typing import (
     Callable,
     Iterable,
@@ -30,6 +30,7 @@ from agentevolver.module.agent_flow.agent_flow import AgentFlow
 from agentevolver.module.agent_flow.base_agent_flow import BaseAgentFlow
 from agentevolver.module.task_manager import adapter
 from agentevolver.module.task_manager.adapter import OnflyRlDataset, to_rl_dataset
+from agentevolver.module.task_manager.checkpoint import GenerationJournal
 from agentevolver.module.task_manager.data_mixture import MixtureStrategy, OriginalOnlyStrategy
 from agentevolver.module.task_manager.filters.llm_filter import LlmFilter
 from agentevolver.module.task_manager.strategies import TaskExploreStrategy
@@ -200,76 +201,76 @@ class TaskManager(object):
         Returns:
             list[TaskObjective]: A list of generated TaskObjective objects.
         """
+        legacy_resume_file = None
         if resume_file is None:
-            resume_file = '.generate_task.checkpoint.json'
+            resume_file = '.generate_task.checkpoint.jsonl'
+            # checkpoints of older versions were single JSON files at this path
+            legacy_resume_file = '.generate_task.checkpoint.json'
 
         # Compute hash of current tasks
         current_tasks_hash = self._compute_tasks_hash(tasks)
-        # Load from checkpoint if resume_file exists
-        res = []
-        processed_indices = set()
-        if resume_file and os.path.exists(resume_file):
-            try:
-                with open(resume_file, 'r') as f:
-                    checkpoint = json.load(f)
-                    # Check if tasks hash matches
-                    if checkpoint['tasks_hash'] != current_tasks_hash:
-                        logger.warning(f"Tasks hash mismatch. Expected: {current_tasks_hash}, got: {checkpoint['tasks_hash']}. Removing checkpoint.")
-                        os.remove(resume_file)
-                    else:
-                        res = [TaskObjective.parse_raw(json.dumps(obj)) for obj in checkpoint.get('results', [])]
-                        processed_indices = {int(i) for i in checkpoint.get('processed_indices', [])}
-                        logger.info(f"Resumed from checkpoint: {len(res)} results loaded, {len(processed_indices)} batches processed")
-            except Exception as e:
-                logger.warning(f"Failed to load checkpoint: {e}, starting from scratch")
 
         # we roll n times for each task
         task_q = list(copy.copy(tasks)) * self._n
-
-        # in each batch, we explore all different tasks or max_threads tasks, in order to avoid generating same task.
+        # at most this many explorations run at once, and never two of the same seed task, in order to avoid generating same task.
         parallel_num = min(self._num_exploration_threads, len(tasks))
-        with ThreadPoolExecutor(max_workers=self._num_exploration_threads) as pool:
-            batch_indices = list(range(0, len(task_q), parallel_num))
-            for idx, i in enumerate(tqdm(batch_indices, desc="generating tasks", disable=not show_progress)):
-                # Skip already processed batches when resuming
-                if idx in processed_indices:
-                    continue
-
-                futures = [
-                    pool.submit(self._exlore_and_summarize, task, data_id, rollout_id)
-                    for task, data_id, rollout_id in zip(
-                        task_q[i : i + parallel_num],
-                        ["unknown"] * parallel_num,
-                        ["unknown"] * parallel_num,
-                    )
-                ]
-                task_objectives = sum([future.result() for future in futures], [])  # ⭐ Collect results from all futures
-                res.extend(task_objectives)
-                # realtime filter
-                res = functools.reduce(lambda x, f: f.filter(x), self._realtime_filters, res)
-                self._old_retrival.reset()
-                for j in res:
-                    self._old_retrival.add_objective(j)
-
-                # Mark this batch as processed
-                processed_indices.add(idx)
-
-                # Save checkpoint
-                if resume_file:
-                    try:
-                        checkpoint_data = {
-                            'results': [obj.dict() for obj in res],
-                            'processed_indices': list(processed_indices),
-                            'total_batches': len(batch_indices),
-                            'tasks_hash': current_tasks_hash,
-                            'timestamp': time.time()
-                        }
-                        with open(resume_file, 'w') as f:
-                            json.dump(checkpoint_data, f, indent=2)
-                    except Exception as e:
-                        logger.warning(f"Failed to save checkpoint: {e}")
 
+        # Replay the append-only checkpoint journal if resume_file exists
+        res = []
+        processed_items = set()  # positions in task_q whose exploration has finished
+        journal = None
+        if resume_file:
+            journal = GenerationJournal(resume_file, current_tasks_hash, len(task_q))
+            processed_items, res = journal.load(legacy_batch_size=parallel_num, legacy_path=legacy_resume_file)
 
+        try:
+            # realtime filters and the retrieval index are fed incrementally: every objective passes through them once
+            for f in self._realtime_filters:
+                f.reset()
+            self._old_retrival.reset()
+            res = self._accept_new_objectives(res)
+
+            # explorations are submitted as soon as a slot frees up instead of waiting for a whole batch,
+            # so one slow exploration no longer idles the rest of the pool
+            pending = deque(i for i in range(len(task_q)) if i not in processed_items)
+            in_flight: dict[Future, int] = {}
+            busy_tasks: set[int] = set()  # positions in `tasks` currently being explored
+
+            def _submit_ready(pool: ThreadPoolExecutor):
+                skipped = []
+                while pending and len(in_flight) < parallel_num:
+                    i = pending.popleft()
+                    if i % len(tasks) in busy_tasks:
+                        skipped.append(i)
+                        continue
+                    busy_tasks.add(i % len(tasks))
+                    in_flight[pool.submit(self._exlore_and_summarize, task_q[i], "unknown", "unknown")] = i
+                pending.extendleft(reversed(skipped))
+
+            with ThreadPoolExecutor(max_workers=self._num_exploration_threads) as pool, \
+                    tqdm(total=len(task_q), initial=len(processed_items), desc="generating tasks", disable=not show_progress) as pbar:
+                _submit_ready(pool)
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = in_flight.pop(future)
+                        busy_tasks.discard(i % len(tasks))
+                        task_objectives = future.result()  # ⭐ Collect results as soon as each exploration finishes
+                        accepted = self._accept_new_objectives(task_objectives)
+                        res.extend(accepted)
+                        processed_items.add(i)
+                        pbar.update(1)
+
+                        # Save checkpoint: only the new record is appended
+                        if journal is not None:
+                            try:
+                                journal.append([i], accepted)
+                            except Exception as e:
+                                logger.warning(f"Failed to save checkpoint: {e}")
+                    _submit_ready(pool)
+        finally:
+            if journal is not None:
+                journal.close()
 
         res = functools.reduce(lambda x, f: f.filter(x), self._realtime_filters, res)
         # post filter
@@ -283,6 +284,24 @@ class TaskManager(object):
         return res
 
 
+    def _accept_new_objectives(self, objectives: Sequence[TaskObjective]) -> list[TaskObjective]:
+        """
+        Pushes newly produced objectives through the realtime filters and adds the accepted ones to the retrieval index.
+
+        Objectives are deduplicated in the order explorations finish, so which of two near-duplicate objectives is kept
+        depends on that order rather than on their confidence.
+
+        Args:
+            objectives (Sequence[TaskObjective]): Objectives not seen by the filters yet.
+
+        Returns:
+            list[TaskObjective]: The accepted objectives.
+        """
+        accepted = functools.reduce(lambda x, f: f.filter_new(x), self._realtime_filters, list(objectives))
+        for j in accepted:
+            self._old_retrival.add_objective(j)
+        return accepted
+
     def _exlore_and_summarize(self,task:Task,data_id:str,rollout_id:str)->list[TaskObjective]:
         """
         Explores the environment based on the provided task and then summarizes the results to generate a list of TaskObjective objects.
@@ -32,3 +32,23 @@ class BaAsyncLLMServerManager(AsyncLLMServerManager):
             self.chat_scheduler_loop,
         )
         future.result()
+
+    async def submit_chat_completions_async(
+            self,
+            messages: List[Dict[str, str]],
+            sampling_params: Dict[str, Any],
+            request_id: Optional[str] = None,
+    ):
+        """Await a chat completion request directly on the chat scheduler loop.
+
+        Unlike `submit_chat_completions`, no thread blocks on a cross-loop future, so thousands of
+        rollouts can share one event loop. Must be awaited from `chat_scheduler_loop`.
+
+        Args: same as ChatCompletionScheduler.submit_chat_completions.
+        """
+        assert self.chat_scheduler is not None, "chat scheduler is not initialized."
+        await self.chat_scheduler._submit_chat_completions_semaphore(
+            messages=messages,
+            request_id=request_id,
+            sampling_params=sampling_params,
+        )
@@ -18,6 +18,7 @@ This trainer supports model-agonistic model initialization with huggingface
 """
 
 import os
+import time
 import uuid
 from collections import defaultdict
 from concurrent.futures.thread import ThreadPoolExecutor
@@ -154,6 +155,18 @@ def union_gen_batch_via_task_id(tasks, batch: DataProto, gen_batch_output: DataP
     return batch_final
 
 
+def _iter_with_next(iterable):
+    """
+    Yields (item, next_item) pairs, with next_item set to None for the last item.
+    """
+    iterator = iter(iterable)
+    current = next(iterator, None)
+    while current is not None:
+        following = next(iterator, None)
+        yield current, following
+        current = following
+
+
 def compute_grpo_outcome_advantage(
     token_level_rewards: torch.Tensor,
     response_mask: torch.Tensor,
@@ -183,35 +196,35 @@ def compute_grpo_outcome_advantage(
     """
     scores = token_level_rewards.sum(dim=-1)
 
-    id2score = defaultdict(list)
-    id2mean = {}
-    id2std = {}
-
     if scores.dim()!=1:
         logger.warning("scores.dim()!=1")
 
     with torch.no_grad():
-        bsz = scores.shape[0]
-        
-        for i in range(bsz):
-            id2score[index[i]].append(scores[i])
-        for idx in id2score:
-            if len(id2score[idx]) == 1:
-                id2mean[idx] = torch.tensor(0.0)
-                id2std[idx] = torch.tensor(1.0)
-            elif len(id2score[idx]) > 1:
-                id2mean[idx] = torch.mean(torch.tensor(id2score[idx]))
-                id2std[idx] = torch.std(torch.tensor([id2score[idx]]))
-            else:
-                raise ValueError(f"no score in prompt index: {idx}")
-        for i in range(bsz):
-            if norm_adv_by_std_in_grpo:
-                scores[i] = (scores[i] - id2mean[index[i]]) / (id2std[index[i]] + epsilon)
-            else:
-                scores[i] = scores[i] - id2mean[index[i]]
-                # no std
-                # if llm judge output similar rewards for undistinguishable samples, we may want to reduce its weight according to the batch std
-                # scores[i] = scores[i] / (batch_std + epsilon)
+        # uids are usually strings: map them to contiguous group ids once, then do all
+        # the group statistics with segment sums instead of a per-sample Python loop
+        _, inverse = np.unique(np.asarray(index), return_inverse=True)
+        group = torch.as_tensor(inverse.reshape(-1), dtype=torch.long, device=scores.device)
+        num_groups = int(group.max().item()) + 1 if group.numel() > 0 else 0
+
+        zeros = torch.zeros(num_groups, dtype=scores.dtype, device=scores.device)
+        counts = zeros.scatter_add(0, group, torch.ones_like(scores))
+        means = zeros.scatter_add(0, group, scores) / counts.clamp(min=1)
+        sq_dev = (scores - means[group]) ** 2
+        # unbiased std, as torch.std
+        stds = torch.sqrt(zeros.scatter_add(0, group, sq_dev) / (counts - 1).clamp(min=1))
+
+        # a prompt with a single response has nothing to compare against
+        singleton = counts == 1
+        means = torch.where(singleton, torch.zeros_like(means), means)
+        stds = torch.where(singleton, torch.ones_like(stds), stds)
+
+        if norm_adv_by_std_in_grpo:
+            scores = (scores - means[group]) / (stds[group] + epsilon)
+        else:
+            scores = scores - means[group]
+            # no std
+            # if llm judge output similar rewards for undistinguishable samples, we may want to reduce its weight according to the batch std
+            # scores = scores / (batch_std + epsilon)
         scores = scores.unsqueeze(-1) * response_mask
 
     return scores, scores
@@ -1026,6 +1039,125 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
         return
 
 
+    def _generate_rollout_batch(self, batch_dict: dict, epoch: int, i: int, policy_version: int = 0, keep_rollout_awake: bool = False) -> dict:
+        """
+        Rolls out one training batch and converts the trajectories into a DataProto.
+
+        This is the generation part of a training step. It is kept separate from `fit` so that, in
+        rollout overlap mode, the next batch can be generated in a background thread while the current
+        batch trains.
+
+        Args:
+            batch_dict (dict): The raw batch from the train dataloader.
+            epoch (int): The current epoch.
+            i (int): The index of the batch within the epoch.
+            policy_version (int, optional): The number of actor updates included in the rollout weights. Defaults to 0.
+            keep_rollout_awake (bool, optional): If True, the rollout servers are assumed to be awake with synced
+                weights and are left awake; otherwise they are woken up and put back to sleep. Defaults to False.
+
+        Returns:
+            dict: The batch, generation inputs and outputs, tasks, trajectories and rollout metrics.
+        """
+        metrics = {}
+        start_time = time.time()
+        batch: DataProto = DataProto.from_single_dict(batch_dict)
+
+        # pop those keys for generation
+        batch_keys_to_pop = ["input_ids", "attention_mask", "position_ids"]
+        non_tensor_batch_keys_to_pop = ["raw_prompt_ids"]
+        if "multi_modal_data" in batch.non_tensor_batch:
+            non_tensor_batch_keys_to_pop.append("multi_modal_data")
+        if "raw_prompt" in batch.non_tensor_batch:
+            non_tensor_batch_keys_to_pop.append("raw_prompt")
+        if "tools_kwargs" in batch.non_tensor_batch:
+            non_tensor_batch_keys_to_pop.append("tools_kwargs")
+        if "extras" in batch.non_tensor_batch:
+            non_tensor_batch_keys_to_pop.append("extras")
+            batch_extras = deepcopy(batch.non_tensor_batch["extras"])
+        else:
+            batch_extras = None
+        gen_batch = batch.pop(
+            batch_keys=batch_keys_to_pop,
+            non_tensor_batch_keys=non_tensor_batch_keys_to_pop,
+        )
+
+        tasks = None
+        trajectories: List[Trajectory] = []
+        num_term_traj = num_not_none_traj = None
+        if not self.async_rollout_mode:
+            gen_batch_output = self.actor_rollout_wg.generate_sequences(gen_batch)
+        else:
+            if keep_rollout_awake:
+                # e.g. validation puts the servers to sleep; the caller must sync (and wake) them first
+                assert self._rollout_awake, "rollout started while the rollout servers are asleep"
+            else:
+                self.async_rollout_manager.wake_up()
+            # gen_batch_output = self.explorer_manager.rollout(gen_batch)
+
+            tasks = [Task(
+                        task_id=gen_batch.non_tensor_batch["extras"][i]["task_id"],
+                        query=gen_batch.non_tensor_batch["extras"][i]['new_query'],
+                        env_type=self.config.env_service.env_type,
+                        open_query=gen_batch.non_tensor_batch["extras"][i]['open_query'],
+                        metadata=gen_batch.non_tensor_batch["extras"][i]['metadata'],
+                        evaluator=gen_batch.non_tensor_batch['extras'][i]['evaluator'],
+                        ground_truth=gen_batch.non_tensor_batch['extras'][i]['ground_truth']
+                    ) for i in range(len(gen_batch))
+            ]
+            task_exp_configs = self.exp_manager.get_complete_exp_configs(tasks, mode="sample")
+            assert len(task_exp_configs)==len(tasks), "{len(task_exp_configs)=}, {len(gen_batch)=}"
+
+            # TODO enable tracing by jinli 0619
+            print("=" * 10 + "start fit rollout" + "=" * 10)
+            trajectories = self.env_manager.rollout(tasks, task_exp_configs, mode="sample", epoch=f"train.{epoch}.{i}")  # ⭐ Generate trajectories using the environment manager
+            assert len(trajectories)>0, "{len(trajectories)=}?"
+            print("=" * 10 + "end fit rollout" + "=" * 10)
+            gen_batch_output = self.env_manager.to_dataproto(trajectories)
+
+            # update metrics about experience manager
+            exp_mask_ratio = gen_batch_output.batch["exp_mask"].float().mean()
+            metrics.update({"exp_mask_ratio": exp_mask_ratio.detach().item()})
+            context_time_cost = [x.metadata["context_time_cost"] for x in trajectories if "context_time_cost" in x.metadata]
+            if context_time_cost:
+                metrics.update({
+                  "exp_manager/context_cost_avg":   np.mean(context_time_cost),
+                  "exp_manager/context_cost_max":   np.max(context_time_cost),
+                  "exp_manager/context_cost_min":   np.min(context_time_cost),
+                })
+
+            print(f"gen_batch_output.info batch.keys={gen_batch_output.batch.keys()}")
+            num_term_traj = sum([traj.is_terminated  for traj in trajectories])
+            num_not_none_traj = sum([len(traj.steps)>0  for traj in trajectories])
+
+            # gen_batch_output = self.async_rollout_manager.generate_sequences(gen_batch)
+            if not keep_rollout_awake:
+                self.async_rollout_manager.sleep()
+
+        return {
+            "batch": batch,
+            "gen_batch": gen_batch,
+            "batch_extras": batch_extras,
+            "tasks": tasks,
+            "trajectories": trajectories,
+            "gen_batch_output": gen_batch_output,
+            "num_term_traj": num_term_traj,
+            "num_not_none_traj": num_not_none_traj,
+            "metrics": metrics,
+            "policy_version": policy_version,
+            "gen_time": time.time() - start_time,
+        }
+
+    def _sync_rollout_weights(self):
+        """
+        Pushes the current actor weights to the rollout servers and leaves them awake.
+
+        Only used in rollout overlap mode, and only at step boundaries when no rollout is in flight.
+        """
+        if self._rollout_awake:
+            self.async_rollout_manager.sleep()
+        self.async_rollout_manager.wake_up()  # ⭐ wake_up reloads the latest actor weights into the rollout engine
+        self._rollout_awake = True
+
     def fit(self):
         """
         The training loop of PPO.
@@ -1072,6 +1204,18 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
         # vscode_conditional_breakpoint()
         # breakpoint()
 
+        # one-step-off-policy mode: roll out batch k+1 in a background thread while batch k trains
+        overlap_config = self.config.trainer.get("rollout_overlap", {})
+        rollout_overlap = overlap_config.get("enable", False)
+        max_staleness = overlap_config.get("max_staleness", 1)
+        if rollout_overlap:
+            assert self.async_rollout_mode, "rollout_overlap requires async rollout mode"
+            assert max_staleness >= 1, f"{max_staleness=} must be >= 1 when rollout_overlap is enabled"
+        rollout_executor = ThreadPoolExecutor(max_workers=1) if rollout_overlap else None
+        self._rollout_awake = False
+        policy_version = 0  # number of actor updates so far
+        synced_version = 0  # policy version currently loaded in the rollout servers
+
         # add tqdm
         progress_bar = tqdm(total=self.total_training_steps, initial=self.global_steps, desc="Training Progress")
 
@@ -1080,79 +1224,50 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
         last_val_metrics = None
         
         for epoch in range(self.config.trainer.total_epochs):
-            for i, batch_dict in enumerate(self.train_dataloader):
+            prefetch = None  # the dataset is updated between epochs, so prefetching stays within an epoch
+            for i, (batch_dict, next_batch_dict) in enumerate(_iter_with_next(self.train_dataloader)):
                 metrics = {}
                 timing_raw = {}
-                batch: DataProto = DataProto.from_single_dict(batch_dict)
-
-                # pop those keys for generation
-                batch_keys_to_pop = ["input_ids", "attention_mask", "position_ids"]
-                non_tensor_batch_keys_to_pop = ["raw_prompt_ids"]
-                if "multi_modal_data" in batch.non_tensor_batch:
-                    non_tensor_batch_keys_to_pop.append("multi_modal_data")
-                if "raw_prompt" in batch.non_tensor_batch:
-                    non_tensor_batch_keys_to_pop.append("raw_prompt")
-                if "tools_kwargs" in batch.non_tensor_batch:
-                    non_tensor_batch_keys_to_pop.append("tools_kwargs")
-                if "extras" in batch.non_tensor_batch:
-                    non_tensor_batch_keys_to_pop.append("extras")
-                    batch_extras = deepcopy(batch.non_tensor_batch["extras"])
-                else:
-                    batch_extras = None
-                gen_batch = batch.pop(
-                    batch_keys=batch_keys_to_pop,
-                    non_tensor_batch_keys=non_tensor_batch_keys_to_pop,
-                )
-
                 is_last_step = self.global_steps >= self.total_training_steps
 
                 with _timer("step", timing_raw):
                     # generate a batch
                     with _timer("gen", timing_raw):
-                        trajectories: List[Trajectory] = []
-                        if not self.async_rollout_mode:
-                            gen_batch_output = self.actor_rollout_wg.generate_sequences(gen_batch)
-                        else:
-                            self.async_rollout_manager.wake_up()
-                            # gen_batch_output = self.explorer_manager.rollout(gen_batch)
-
-                            tasks = [Task(
-                                        task_id=gen_batch.non_tensor_batch["extras"][i]["task_id"],
-                                        query=gen_batch.non_tensor_batch["extras"][i]['new_query'],
-                                        env_type=self.config.env_service.env_type,
-                                        open_query=gen_batch.non_tensor_batch["extras"][i]['open_query'],
-                                        metadata=gen_batch.non_tensor_batch["extras"][i]['metadata'],
-                                        evaluator=gen_batch.non_tensor_batch['extras'][i]['evaluator'],
-                                        ground_truth=gen_batch.non_tensor_batch['extras'][i]['ground_truth']
-                                    ) for i in range(len(gen_batch))
-                            ]
-                            task_exp_configs = self.exp_manager.get_complete_exp_configs(tasks, mode="sample")
-                            assert len(task_exp_configs)==len(tasks), "{len(task_exp_configs)=}, {len(gen_batch)=}"
-
-                            # TODO enable tracing by jinli 0619
-                            print("=" * 10 + "start fit rollout" + "=" * 10)
-                            trajectories = self.env_manager.rollout(tasks, task_exp_configs, mode="sample", epoch=f"train.{epoch}.{i}")  # ⭐ Generate trajectories using the environment manager
-                            assert len(trajectories)>0, "{len(trajectories)=}?"
-                            print("=" * 10 + "end fit rollout" + "=" * 10)
-                            gen_batch_output = self.env_manager.to_dataproto(trajectories)
-                            
-                            # update metrics about experience manager
-                            exp_mask_ratio = gen_batch_output.batch["exp_mask"].float().mean()
-                            metrics.update({"exp_mask_ratio": exp_mask_ratio.detach().item()})
-                            context_time_cost = [x.metadata["context_time_cost"] for x in trajectories if "context_time_cost" in x.metadata]
-                            if context_time_cost:
-                                metrics.update({
-                                  "exp_manager/context_cost_avg":   np.mean(context_time_cost),
-                                  "exp_manager/context_cost_max":   np.max(context_time_cost),
-                                  "exp_manager/context_cost_min":   np.min(context_time_cost),
-                                })
-
-                            print(f"gen_batch_output.info batch.keys={gen_batch_output.batch.keys()}")
-                            num_term_traj = sum([traj.is_terminated  for traj in trajectories])
-                            num_not_none_traj = sum([len(traj.steps)>0  for traj in trajectories])
-
-                            # gen_batch_output = self.async_rollout_manager.generate_sequences(gen_batch)
-                            self.async_rollout_manager.sleep()
+                        rollout = None
+                        if prefetch is not None:
+                            # one-step-off-policy: the rollout of this batch ran in the background during the previous update
+                            rollout = prefetch.result()
+                            prefetch = None
+                            staleness = policy_version - rollout["policy_version"]
+                            metrics.update({"rollout_overlap/staleness": staleness, "timing_s/gen_background": rollout["gen_time"]})
+                            if staleness > max_staleness:
+                                logger.warning(f"prefetched rollout is {staleness} updates stale (max_staleness={max_staleness}), regenerating")
+                                rollout = None
+                        if rollout is None:
+                            if rollout_overlap:
+                                # regenerating always needs the latest weights, which also wakes sleeping servers
+                                self._sync_rollout_weights()
+                                synced_version = policy_version
+                            rollout = self._generate_rollout_batch(batch_dict, epoch, i, policy_version=synced_version, keep_rollout_awake=rollout_overlap)
+
+                    # launch the rollout of the next batch, it runs while this batch trains
+                    if rollout_overlap and next_batch_dict is not None and not is_last_step:
+                        if not self._rollout_awake or policy_version - synced_version >= max_staleness:
+                            # weight sync only happens at step boundaries; it also wakes servers put to sleep by validation
+                            self._sync_rollout_weights()
+                            synced_version = policy_version
+                        prefetch = rollout_executor.submit(self._generate_rollout_batch, next_batch_dict, epoch, i + 1,
+                                                           policy_version=synced_version, keep_rollout_awake=True)
+
+                    batch: DataProto = rollout["batch"]
+                    gen_batch: DataProto = rollout["gen_batch"]
+                    batch_extras = rollout["batch_extras"]
+                    tasks: List[Task] = rollout["tasks"]
+                    trajectories: List[Trajectory] = rollout["trajectories"]
+                    gen_batch_output: DataProto = rollout["gen_batch_output"]
+                    num_term_traj = rollout["num_term_traj"]
+                    num_not_none_traj = rollout["num_not_none_traj"]
+                    metrics.update(rollout["metrics"])
 
                     if self.config.algorithm.adv_estimator == AdvantageEstimator.REMAX:
                         with _timer("gen_max", timing_raw):
@@ -1319,6 +1434,17 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
                                     if evaluator != 'env':
                                         batch.batch["advantages"][i] *= 0.5  # ⭐ Apply decay factor to synthetic data
 
+                        # Down-weight rollouts that long-tail cancellation truncated but kept in the batch
+                        long_tail_cfg = self.config.actor_rollout_ref.rollout.get("long_tail", None)
+                        if long_tail_cfg is not None and long_tail_cfg.get("cancelled_action", "drop") == "keep":
+                            cancelled_weight = long_tail_cfg.get("cancelled_weight", 0.5)
+                            num_cancelled = 0
+                            for idx, sample_extras in enumerate(batch.non_tensor_batch["extras"]):
+                                if sample_extras.get("long_tail_cancelled", False):
+                                    batch.batch["advantages"][idx] *= cancelled_weight  # ⭐ Scale the truncated prefix's advantage
+                                    num_cancelled += 1
+                            metrics["long_tail/cancelled_samples"] = num_cancelled
+
                     # update critic
                     if self.use_critic:
                         with _timer("update_critic", timing_raw):
@@ -1334,6 +1460,7 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
                             actor_output = self.actor_rollout_wg.update_actor(batch)  # ⭐ Update the actor with the new batch
                         actor_output_metrics = reduce_metrics(actor_output.meta_info["metrics"])
                         metrics.update(actor_output_metrics)
+                        policy_version += 1
                     
                     # collect summary tasks
                     if summary_task is not None:
@@ -1371,7 +1498,10 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
                     # validate
                     if self.val_reward_fn is not None and self.config.trainer.test_freq > 0 and (is_last_step or self.global_steps % self.config.trainer.test_freq == 0):
                         with _timer("testing", timing_raw):
+                            if prefetch is not None:
+                                prefetch.result()  # validation wakes and sleeps the rollout servers, let the background rollout finish first
                             val_metrics: dict = self._validate()  # ⭐ Validate the model and collect validation metrics
+                            self._rollout_awake = False
                             if is_last_step:
                                 last_val_metrics = val_metrics
                         metrics.update(val_metrics)
@@ -1404,6 +1534,8 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
                 if is_last_step:
                     pprint(f"Final validation metrics: {last_val_metrics}")
                     progress_bar.close()
+                    if rollout_executor is not None:
+                        rollout_executor.shutdown(wait=True)
                     return
 
             # we expect the train dataset is fully explored at the beginning, no reload needed.
@@ -1414,6 +1546,9 @@ class AgentEvolverRayPPOTrainer(RayPPOTrainer):
                 print("DEBUG: change ratio of synthetic data from 1 to 0.5")
                 assert isinstance(self.train_dataset._mixture_strategy,UnifiedMixtureStrategy)
                 self.train_dataset._mixture_strategy._synthetic_ratio-=1/5 # initial 1, 0 at about epoch 5 (about step 30)
+            if rollout_overlap and self._rollout_awake:
+                self.async_rollout_manager.sleep()
+                self._rollout_awake = False
             self.train_dataset.update()  # ⭐ Update the training dataset for the next iteration
 
 
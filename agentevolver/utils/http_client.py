@@ -44,13 +44,17 @@ class HttpClient(BaseModel):
                  json_data: dict = None,
                  headers: dict = None,
                  stream: bool = False,
-                 http_enum: HttpEnum | str = HttpEnum.POST):
+                 http_enum: HttpEnum | str = HttpEnum.POST,
+                 url: str = None):
 
         if isinstance(http_enum, str):
             http_enum = HttpEnum(http_enum)
+        # a per-call url lets one client hit several endpoints from many threads
+        # without racing on the shared `self.url`
+        url = url or self.url
 
         if http_enum is HttpEnum.POST:
-            response: requests.Response = self._client.post(url=self.url,
+            response: requests.Response = self._client.post(url=url,
                                                             data=data,
                                                             json=json_data,
                                                             headers=headers,
@@ -58,7 +62,7 @@ class HttpClient(BaseModel):
                                                             timeout=self.timeout)
 
         elif http_enum is HttpEnum.GET:
-            response: requests.Response = self._client.get(url=self.url,
+            response: requests.Response = self._client.get(url=url,
                                                            data=data,
                                                            json=json_data,
                                                            headers=headers,
@@ -84,12 +88,13 @@ class HttpClient(BaseModel):
                 json_data: dict = None,
                 headers: dict = None,
                 http_enum: HttpEnum | str = HttpEnum.POST,
+                url: str = None,
                 **kwargs):
 
         retry_sleep_time = self.retry_sleep_time
         for i in range(self.retry_max_count):
             try:
-                response = self._request(data=data, json_data=json_data, headers=headers, http_enum=http_enum)
+                response = self._request(data=data, json_data=json_data, headers=headers, http_enum=http_enum, url=url)
                 result = self.parse_result(response=response,
                                            data=data,
                                            json_data=json_data,
@@ -117,6 +122,7 @@ class HttpClient(BaseModel):
                        json_data: dict = None,
                        headers: dict = None,
                        http_enum: HttpEnum | str = HttpEnum.POST,
+                       url: str = None,
                        **kwargs):
 
         retry_sleep_time = self.retry_sleep_time
@@ -126,7 +132,8 @@ class HttpClient(BaseModel):
                                          json_data=json_data,
                                          headers=headers,
                                          stream=True,
-                                         http_enum=http_enum)
+                                         http_enum=http_enum,
+                                         url=url)
                 request_context = {}
                 for iter_idx, line in enumerate(response.iter_lines()):
                     yield self.parse_result(line=line,
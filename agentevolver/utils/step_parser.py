@@ -2,6 +2,9 @@
 # FIXME: This file is step_parser.py, function: parse model's response_id into steps, unify all modules that need steps
 from dataclasses import dataclass
 from typing import List, Dict, Tuple
+import hashlib
+import json
+import threading
 import torch
 
 @dataclass
@@ -137,6 +140,31 @@ def _extract_role_header_tokens(tokenizer, role: str) -> List[int]:
         # Don't fall back, throw error directly
         raise RuntimeError(f"Failed to extract header tokens for role '{role}': {e}") from e
 
+# (tokenizer name, chat template hash, role) -> header tokens, computed once per process
+_ROLE_HEADER_CACHE: Dict[Tuple[str, str, str], Tuple[int, ...]] = {}
+_ROLE_HEADER_LOCK = threading.Lock()
+
+def _tokenizer_cache_key(tokenizer) -> Tuple[str, str]:
+    """Identify a tokenizer by its name and a hash of its chat template"""
+    chat_template = getattr(tokenizer, "chat_template", None) or ""
+    if not isinstance(chat_template, str):
+        chat_template = json.dumps(chat_template, sort_keys=True)
+    name = getattr(tokenizer, "name_or_path", None) or type(tokenizer).__name__
+    return name, hashlib.md5(chat_template.encode("utf-8")).hexdigest()
+
+def get_role_header_tokens(tokenizer, role: str) -> List[int]:
+    """
+    Cached version of _extract_role_header_tokens: the chat template is only rendered
+    the first time a (tokenizer, role) pair is seen
+    """
+    key = (*_tokenizer_cache_key(tokenizer), role)
+    header_tokens = _ROLE_HEADER_CACHE.get(key)
+    if header_tokens is None:
+        header_tokens = tuple(_extract_role_header_tokens(tokenizer, role))
+        with _ROLE_HEADER_LOCK:
+            _ROLE_HEADER_CACHE[key] = header_tokens
+    return list(header_tokens)
+
 def parse_response_ids_to_steps(
     response_ids: List[int],
     tokenizer,
@@ -144,11 +172,11 @@ def parse_response_ids_to_steps(
     user_tpl: List[int] = None,
     mark_observation: bool = False,
 ) -> StepParseResult:
-    # 1) Automatically extract templates
+    # 1) Automatically extract templates (cached per tokenizer)
     if assistant_tpl is None:
-        assistant_tpl = _extract_role_header_tokens(tokenizer, "assistant")
+        assistant_tpl = get_role_header_tokens(tokenizer, "assistant")
     if user_tpl is None:
-        user_tpl = _extract_role_header_tokens(tokenizer, "user")
+        user_tpl = get_role_header_tokens(tokenizer, "user")
 
     # 2) Locate headers and bodies
     a_hdr = _locate_template_positions(response_ids, assistant_tpl) if assistant_tpl else []
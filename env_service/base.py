@@ -80,6 +80,29 @@ class BaseEnv(ABC):
         Close the environment and release any resources.
         """
 
+    def reset(
+        self,
+        task_id: str = None,
+        instance_id: str = None,
+        params: Dict[str, Any] = None,
+    ) -> None:
+        """
+        Re-bind a pooled environment to a new task in place.
+
+        Optional hook used by the env service actor pool. It is called on
+        an environment that has already been closed. Environments that can
+        cheaply switch tasks should override it; the default raises
+        NotImplementedError and the pooled actor rebuilds the environment
+        object instead.
+
+        Args:
+            task_id (str): The ID of the new task.
+            instance_id (str): The ID of the new instance.
+            params (Dict[str, Any]): Additional parameters
+                        for initializing the environment.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def get_info(
         self,
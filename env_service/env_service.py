@@ -12,22 +12,24 @@ interacting with them.
 import argparse
 import asyncio
 from dataclasses import dataclass
+import heapq
 import importlib
 import os
 import sys
 import time
 import uuid
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
 from pathlib import Path
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import ray
 import uvicorn
 from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
+from ray.exceptions import RayActorError
 
 
+from .metrics import ServiceMetrics
 from .registry import Registry
 
 
@@ -121,6 +123,14 @@ class ServiceRequest(BaseModel):
     params: Dict[str, Any] = {}
 
 
+class BatchServiceRequest(BaseModel):
+    """
+    Batched service request class, one ServiceRequest per instance.
+    """
+
+    requests: List[ServiceRequest] = []
+
+
 class EnvService:
     """
     Manages the lifecycle of training environment instances.
@@ -146,21 +156,136 @@ class EnvService:
         self.last_access_time = {}
         self.cleanup_interval = 300
         self.max_idle_time = 3600
+        # per env type idle TTL in seconds, falls back to max_idle_time
+        self.idle_ttl: Dict[str, float] = {}
+        # min-heap of (deadline, instance_id); entries are validated lazily on pop
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.scheduled_expiry = set()
+        self.expiry_changed = asyncio.Event()
+        self.metrics = ServiceMetrics()
+        # warm actor pool: env_type -> idle actors ready for reset
+        self.pool_size = 0
+        self.idle_actors: Dict[str, List[Any]] = {}
+        self.actor_env_type = {}
+
+    def warmup_pool(self, env_type: str, pool_size: int) -> None:
+        """
+        Pre-start idle actors for the specified environment type.
 
-    async def cleanup_inactive_instances(self):
+        Args:
+            env_type (str): The type of environment.
+            pool_size (int): The number of idle actors to keep around.
+        """
+        self.pool_size = pool_size
+        env_remote_cls = self.get_remote_env_cls(env_type)
+        pool = self.idle_actors.setdefault(env_type, [])
+        while len(pool) < pool_size:
+            pool.append(env_remote_cls.remote())
+        print(f"Warmed up {len(pool)} {env_type} actors")
+
+    async def acquire_actor(
+        self,
+        env_type: str,
+        task_id: str,
+        instance_id: str,
+        params: Dict,
+    ):
+        """
+        Take an idle actor from the pool and bind it to the task.
+
+        Falls back to starting a fresh actor when the pool is empty. A
+        pooled actor that died is killed and the bind is retried once;
+        any other reset error comes from the task itself, so the actor
+        goes back to the pool and the error is raised.
+        """
+        env_remote_cls = self.get_remote_env_cls(env_type)
+        pool = self.idle_actors.get(env_type, [])
+        for _ in range(2):
+            if not pool:
+                break
+            env_actor = pool.pop()
+            try:
+                await env_actor.reset.remote(task_id, instance_id, params)
+                return env_actor
+            except RayActorError as e:
+                print(f"Pooled {env_type} actor died on reset: {str(e)}")
+                ray.kill(env_actor)
+            except Exception:
+                pool.append(env_actor)
+                raise
+        return env_remote_cls.remote(task_id, instance_id, params)
+
+    def get_env_type(self, instance_id: str) -> str:
+        """Return the env type an instance was created with."""
+        return self.actor_env_type.get(instance_id, "unknown")
+
+    def collect_gauges(self) -> Dict[str, Any]:
         """
-        Periodically clean up inactive environment instances.
+        Snapshot instance and actor counts for the metrics endpoint.
 
-        Releases instances that have been idle for longer than the
-        specified maximum idle time.
+        Returns:
+            Dict[str, Any]: Gauges as ``name -> (help, samples)``.
+        """
+        active = {}
+        for instance_id in list(self.env_actors):
+            key = (("env_type", self.get_env_type(instance_id)),)
+            active[key] = active.get(key, 0) + 1
+        idle = {
+            (("env_type", env_type),): len(pool)
+            for env_type, pool in self.idle_actors.items()
+        }
+        return {
+            "env_service_active_instances": (
+                "Instances currently bound to an env actor, by env type.",
+                active,
+            ),
+            "env_service_idle_actors": (
+                "Warm pooled actors waiting for a task, by env type.",
+                idle,
+            ),
+            "env_service_scheduled_expirations": (
+                "Entries in the idle-expiry heap.",
+                {(): len(self.expiry_heap)},
+            ),
+        }
+
+    def get_idle_ttl(self, instance_id: str) -> float:
+        """Return the idle TTL in seconds that applies to an instance."""
+        env_type = self.actor_env_type.get(instance_id)
+        return self.idle_ttl.get(env_type, self.max_idle_time)
+
+    def next_expiry_delay(self) -> float:
+        """
+        Seconds until the earliest scheduled expiration, bounded by
+        cleanup_interval so the loop still wakes up periodically.
         """
+        if not self.expiry_heap:
+            return self.cleanup_interval
+        delay = self.expiry_heap[0][0] - time.monotonic()
+        return min(max(delay, 0.0), self.cleanup_interval)
 
-        current_time = datetime.now()
+    async def cleanup_inactive_instances(self):
+        """
+        Release instances that have been idle for longer than their TTL.
+
+        Pops expired entries from the expiry heap. An entry whose instance
+        was accessed again after it was scheduled is pushed back with its
+        real deadline, and entries of released instances are dropped, so
+        each expiration costs O(log n) instead of a scan over all instances.
+        """
+        current_time = time.monotonic()
         instances_to_release = []
-        for instance_id, last_access in self.last_access_time.items():
-            if (current_time - last_access) > timedelta(
-                seconds=self.max_idle_time,
-            ):
+        while self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+            _, instance_id = heapq.heappop(self.expiry_heap)
+            last_access = self.last_access_time.get(instance_id)
+            if last_access is None:
+                self.scheduled_expiry.discard(instance_id)
+                continue
+            deadline = last_access + self.get_idle_ttl(instance_id)
+            if deadline > current_time:
+                heapq.heappush(self.expiry_heap, (deadline, instance_id))
+            else:
+                self.scheduled_expiry.discard(instance_id)
                 instances_to_release.append(instance_id)
 
         for instance_id in instances_to_release:
@@ -169,7 +294,15 @@ class EnvService:
 
     def update_access_time(self, instance_id):
         """Update the last access time for an environment instance."""
-        self.last_access_time[instance_id] = datetime.now()
+        now = time.monotonic()
+        self.last_access_time[instance_id] = now
+        if instance_id not in self.scheduled_expiry:
+            # one heap entry per instance; later accesses only move last_access_time
+            self.scheduled_expiry.add(instance_id)
+            deadline = now + self.get_idle_ttl(instance_id)
+            heapq.heappush(self.expiry_heap, (deadline, instance_id))
+            if self.expiry_heap[0][1] == instance_id:
+                self.expiry_changed.set()
 
     def get_remote_env_cls(self, env_type: str):
         """
@@ -188,9 +321,12 @@ class EnvService:
         class RemoteEnv:
             """
             Remote environment class.
+
+            The actor may be started without a task so that it can sit in
+            the warm pool; ``reset`` binds it to a task before use.
             """
 
-            def __init__(self, task_id, instance_id, params):
+            def __init__(self, task_id=None, instance_id=None, params=None):
                 """Detailed init"""
 
                 server_dir = os.path.abspath(
@@ -204,15 +340,33 @@ class EnvService:
                         f"env_service.environments.{env_type}."
                         f"{env_type}_env",
                     )
-                    envir_class = getattr(
+                    self.envir_class = getattr(
                         module,
                         f"{env_type.capitalize()}Env",
                     )
-                    self.env = envir_class(task_id, instance_id, params)
                 except ImportError as e:
                     print(f"Error importing {env_type}_env: {e}")
                     raise
 
+                self.env = None
+                if task_id is not None:
+                    self.env = self.envir_class(task_id, instance_id, params)
+
+            def reset(self, task_id, instance_id, params):
+                """bind the actor to a new task, reusing the env if possible"""
+                if self.env is not None:
+                    try:
+                        self.env.reset(task_id, instance_id, params)
+                        return True
+                    except NotImplementedError:
+                        pass
+                    except Exception:
+                        # rebuild on the next reset instead of reusing a half-reset env
+                        self.env = None
+                        raise
+                self.env = self.envir_class(task_id, instance_id, params)
+                return True
+
             def get_init_state(self, params):
                 """remote init state"""
                 return self.env.get_init_state(params)
@@ -231,6 +385,8 @@ class EnvService:
 
             def close(self):
                 """remote close"""
+                if self.env is None:
+                    return None
                 return self.env.close()
 
         self.remote_env[env_type] = RemoteEnv
@@ -317,8 +473,6 @@ class EnvService:
             if instance_id is None:
                 instance_id = f"exp_{int(time.time())}_{uuid.uuid4().hex[:8]}"
 
-            env_remote_cls = self.get_remote_env_cls(env_type)
-
             print(
                 f"Creating instance with env_type: {env_type}, "
                 f"task_id: {task_id}, "
@@ -327,11 +481,16 @@ class EnvService:
 
             if env_type == "webshop":
                 params["server"] = SIM_SERVER
-                env_actor = env_remote_cls.remote(task_id, instance_id, params)
-            else:
-                env_actor = env_remote_cls.remote(task_id, instance_id, params)
+
+            env_actor = await self.acquire_actor(
+                env_type,
+                task_id,
+                instance_id,
+                params,
+            )
 
             self.env_actors[instance_id] = env_actor
+            self.actor_env_type[instance_id] = env_type
             init_state = await env_actor.get_init_state.remote(params)
 
             self.update_access_time(instance_id)
@@ -383,6 +542,67 @@ class EnvService:
             print(f"Error in step: {str(e)}")
             raise
 
+    async def batch_create(self, requests: List[ServiceRequest]) -> List[Any]:
+        """
+        Create several environment instances concurrently.
+
+        Args:
+            requests (List[ServiceRequest]): One create request per instance.
+
+        Returns:
+            List[Any]: The initial state of each instance, or the raised
+                exception for failed ones, in request order.
+        """
+        return await asyncio.gather(
+            *[
+                self.create_instance(
+                    env_type=request.env_type,
+                    task_id=request.task_id,
+                    instance_id=request.instance_id,
+                    params=request.params,
+                )
+                for request in requests
+            ],
+            return_exceptions=True,
+        )
+
+    async def batch_step(self, requests: List[ServiceRequest]) -> List[Any]:
+        """
+        Execute one step in each of several environment instances.
+
+        All actor calls are dispatched first and awaited together, so the
+        batch costs a single round trip to the Ray actors.
+
+        Args:
+            requests (List[ServiceRequest]): One step request per instance,
+                carrying the instance ID and the action in ``messages``.
+
+        Returns:
+            List[Any]: The step result of each instance, or the raised
+                exception for failed ones, in request order.
+        """
+        results: List[Any] = [None] * len(requests)
+        pending = {}
+        for idx, request in enumerate(requests):
+            if request.instance_id not in self.env_actors:
+                results[idx] = ValueError(
+                    f"Instance {request.instance_id} not found!",
+                )
+                continue
+            self.update_access_time(request.instance_id)
+            pending[idx] = self.env_actors[request.instance_id].step.remote(
+                request.messages,
+                request.params,
+            )
+
+        outputs = await asyncio.gather(
+            *pending.values(),
+            return_exceptions=True,
+        )
+        for idx, output in zip(pending, outputs):
+            results[idx] = output
+        return results
+
     async def evaluate(
         self,
         instance_id: str,
@@ -420,6 +640,9 @@ class EnvService:
         """
         Release the specified environment instance.
 
+        The actor is closed and returned to the warm pool of its env type
+        if there is room, otherwise it is killed.
+
         Args:
             instance_id (str):
                 The ID of the environment instance to be released.
@@ -431,11 +654,21 @@ class EnvService:
         """
         if instance_id not in self.env_actors:
             return False
-        env_actor = self.env_actors[instance_id]
-        await env_actor.close.remote()
-        ray.kill(self.env_actors[instance_id])
-        del self.env_actors[instance_id]
+        env_actor = self.env_actors.pop(instance_id)
+        env_type = self.actor_env_type.pop(instance_id, None)
         self.last_access_time.pop(instance_id, None)
+        try:
+            await env_actor.close.remote()
+        except Exception as e:
+            print(f"Error closing instance {instance_id}: {str(e)}")
+            ray.kill(env_actor)
+            return True
+
+        pool = self.idle_actors.get(env_type)
+        if pool is not None and len(pool) < self.pool_size:
+            pool.append(env_actor)
+        else:
+            ray.kill(env_actor)
         return True
 
 
@@ -468,7 +701,15 @@ async def cleanup_loop():
     lifespan context manager.
     """
     while True:
-        await asyncio.sleep(env_service.cleanup_interval)
+        try:
+            # sleep until the earliest deadline, or until an earlier one is scheduled
+            await asyncio.wait_for(
+                env_service.expiry_changed.wait(),
+                timeout=env_service.next_expiry_delay(),
+            )
+        except asyncio.TimeoutError:
+            pass
+        env_service.expiry_changed.clear()
         await env_service.cleanup_inactive_instances()
 
 
@@ -491,6 +732,26 @@ async def healthz():
     return Response(content="OK", status_code=200)
 
 
+@app.get(
+    "/metrics",
+    summary="Request counters, latency histograms and actor gauges",
+)
+async def metrics():
+    """
+    Expose service metrics in the Prometheus text format.
+
+    Returns:
+        Response: Per endpoint and env type request counters and
+            latency histograms, plus active instance and idle actor
+            gauges.
+    """
+    content = env_service.metrics.render(env_service.collect_gauges())
+    return Response(
+        content=content,
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.post("/get_env_profile")
 async def handle_env_profile(request: ServiceRequest):
     """
@@ -506,16 +767,16 @@ async def handle_env_profile(request: ServiceRequest):
         and the list of task IDs.
     """
     try:
-        if request.env_type is None:
-            raise ValueError("env_type is required")
-
-        split = request.params.get("split", "train")
-
-        task_ids = await env_service.get_env_profile(
-            env_type=request.env_type,
-            split=split,
-            params=request.params,
-        )
+        with env_service.metrics.track("get_env_profile", request.env_type):
+            if request.env_type is None:
+                raise ValueError("env_type is required")
+
+            split = request.params.get("split", "train")
+            task_ids = await env_service.get_env_profile(
+                env_type=request.env_type,
+                split=split,
+                params=request.params,
+            )
         return {"success": True, "data": task_ids}
     except Exception as e:
         import traceback
@@ -545,19 +806,18 @@ async def handle_create(request: ServiceRequest):
             in creating the instance (400 or 500 status codes).
     """
     try:
-        if not request.env_type:
-            raise ValueError("env_type is required")
-        if not request.task_id:
-            raise ValueError("task_id is required")
-
-        instance_id = request.instance_id
-
-        init_state = await env_service.create_instance(
-            env_type=request.env_type,
-            task_id=request.task_id,
-            instance_id=instance_id,
-            params=request.params,
-        )
+        with env_service.metrics.track("create", request.env_type):
+            if not request.env_type:
+                raise ValueError("env_type is required")
+            if not request.task_id:
+                raise ValueError("task_id is required")
+
+            init_state = await env_service.create_instance(
+                env_type=request.env_type,
+                task_id=request.task_id,
+                instance_id=request.instance_id,
+                params=request.params,
+            )
         return {"success": True, "data": init_state}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -588,14 +848,15 @@ async def handle_step(request: ServiceRequest):
             executing the step (400 or 500 status codes).
     """
     try:
-        if not request.instance_id:
-            raise ValueError("instance_id is required")
-
-        result = await env_service.step(
-            instance_id=request.instance_id,
-            action=request.messages,
-            params=request.params,
-        )
+        with env_service.metrics.track("step", env_service.get_env_type(request.instance_id)):
+            if not request.instance_id:
+                raise ValueError("instance_id is required")
+
+            result = await env_service.step(
+                instance_id=request.instance_id,
+                action=request.messages,
+                params=request.params,
+            )
         return {"success": True, "data": result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -606,6 +867,106 @@ async def handle_step(request: ServiceRequest):
         raise HTTPException(status_code=500, detail=tb) from e
 
 
+def _batch_response(results: List[Any]) -> List[Dict[str, Any]]:
+    """Wrap per-instance results, turning exceptions into error entries."""
+    response = []
+    for result in results:
+        if isinstance(result, BaseException):
+            response.append(
+                {"success": False, "data": None, "error": str(result)},
+            )
+        else:
+            response.append({"success": True, "data": result})
+    return response
+
+
+def _batch_env_type(
+    requests: List[ServiceRequest],
+    env_types: Optional[List[str]] = None,
+) -> str:
+    """Metrics label for a batch: its env type, or ``mixed``."""
+    if env_types is None:
+        env_types = [r.env_type for r in requests]
+    unique = set(env_types)
+    return unique.pop() if len(unique) == 1 else "mixed"
+
+
+@app.post("/batch_create")
+async def handle_batch_create(request: BatchServiceRequest):
+    """
+    Create several environment instances in one call.
+
+    Args:
+        request (BatchServiceRequest): One create request per instance,
+            each with env_type, task_id and optional instance_id.
+
+    Returns:
+        dict: A dictionary whose ``data`` holds one
+            ``{"success", "data"}`` entry per request, in order.
+
+    Raises:
+        HTTPException: If the batch itself is malformed (400)
+            or fails unexpectedly (500).
+    """
+    try:
+        env_types = [item.env_type for item in request.requests]
+        with env_service.metrics.track("batch_create", _batch_env_type(request.requests)) as outcome:
+            for item in request.requests:
+                if not item.env_type:
+                    raise ValueError("env_type is required")
+                if not item.task_id:
+                    raise ValueError("task_id is required")
+
+            results = await env_service.batch_create(request.requests)
+            if env_service.metrics.observe_items("batch_create", env_types, results):
+                outcome["status"] = "partial"
+        return {"success": True, "data": _batch_response(results)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except Exception as e:
+        import traceback
+
+        tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        raise HTTPException(status_code=500, detail=tb) from e
+
+
+@app.post("/batch_step")
+async def handle_batch_step(request: BatchServiceRequest):
+    """
+    Execute one step in each of several environment instances.
+
+    Args:
+        request (BatchServiceRequest): One step request per instance,
+            each with instance_id and the action in ``messages``.
+
+    Returns:
+        dict: A dictionary whose ``data`` holds one
+            ``{"success", "data"}`` entry per request, in order.
+
+    Raises:
+        HTTPException: If the batch itself is malformed (400)
+            or fails unexpectedly (500).
+    """
+    try:
+        env_types = [env_service.get_env_type(r.instance_id) for r in request.requests]
+        with env_service.metrics.track("batch_step", _batch_env_type(request.requests, env_types)) as outcome:
+            for item in request.requests:
+                if not item.instance_id:
+                    raise ValueError("instance_id is required")
+
+            results = await env_service.batch_step(request.requests)
+            if env_service.metrics.observe_items("batch_step", env_types, results):
+                outcome["status"] = "partial"
+        return {"success": True, "data": _batch_response(results)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except Exception as e:
+        import traceback
+
+        tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        raise HTTPException(status_code=500, detail=tb) from e
+
+
 @app.post("/evaluate")
 async def handle_evaluate(request: ServiceRequest):
     """
@@ -626,14 +987,15 @@ async def handle_evaluate(request: ServiceRequest):
             in evaluating the instance (400 or 500 status codes).
     """
     try:
-        if not request.instance_id:
-            raise ValueError("instance_id is required")
-
-        score = await env_service.evaluate(
-            instance_id=request.instance_id,
-            messages=request.messages,
-            params=request.params,
-        )
+        with env_service.metrics.track("evaluate", env_service.get_env_type(request.instance_id)):
+            if not request.instance_id:
+                raise ValueError("instance_id is required")
+
+            score = await env_service.evaluate(
+                instance_id=request.instance_id,
+                messages=request.messages,
+                params=request.params,
+            )
         return {"success": True, "data": score}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -665,14 +1027,15 @@ async def handle_get_info(request: ServiceRequest):
             in retrieving the information (400 or 500 status codes).
     """
     try:
-        if not request.instance_id:
-            raise ValueError("instance_id is required")
-
-        env_info = await env_service.get_info(
-            instance_id=request.instance_id,
-            messages=request.messages,
-            params=request.params,
-        )
+        with env_service.metrics.track("get_info", env_service.get_env_type(request.instance_id)):
+            if not request.instance_id:
+                raise ValueError("instance_id is required")
+
+            env_info = await env_service.get_info(
+                instance_id=request.instance_id,
+                messages=request.messages,
+                params=request.params,
+            )
         return {"success": True, "data": env_info}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -703,10 +1066,12 @@ async def handle_release(request: ServiceRequest):
             releasing the instance (400 or 500 status codes).
     """
     try:
-        if not request.instance_id:
-            raise ValueError("instance_id is required")
+        env_type = env_service.get_env_type(request.instance_id)
+        with env_service.metrics.track("release", env_type):
+            if not request.instance_id:
+                raise ValueError("instance_id is required")
 
-        success = await env_service.release_instance(request.instance_id)
+            success = await env_service.release_instance(request.instance_id)
         return {"success": success, "data": None}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
@@ -744,6 +1109,24 @@ if __name__ == "__main__":
         default=8000,
         help="Port to run the server on",
     )
+    parser.add_argument(
+        "--pool_size",
+        type=int,
+        default=0,
+        help="Number of pre-started env actors kept warm for reuse",
+    )
+    parser.add_argument(
+        "--max_idle_time",
+        type=int,
+        default=3600,
+        help="Seconds an instance may stay idle before it is released",
+    )
+    parser.add_argument(
+        "--idle_ttl",
+        type=str,
+        default="",
+        help="Per env type idle TTL overrides, e.g. 'appworld=600,bfcl=300'",
+    )
     parser.add_argument(
         "--debug",
         type=bool,
@@ -757,6 +1140,14 @@ if __name__ == "__main__":
         print(f"Failed to import and register environment {args.env}")
         sys.exit(1)
 
+    if args.pool_size > 0:
+        env_service.warmup_pool(args.env, args.pool_size)
+
+    env_service.max_idle_time = args.max_idle_time
+    for item in filter(None, args.idle_ttl.split(",")):
+        env_name, ttl = item.split("=")
+        env_service.idle_ttl[env_name.strip()] = float(ttl)
+
     print(f"Starting server on {args.portal}:{args.port}")
 
     if args.debug:
@@ -20,6 +20,7 @@ import json, os
 from pathlib import Path
 from typing import Any, Dict, List
 import re
+import threading
 import uuid
 
 from env_service.base import BaseEnv
@@ -35,6 +36,63 @@ os.environ.setdefault("BFCL_ANSWER_PATH", "./bfcl_eval/possible_answer")
 
 __all__ = ["BfclEnv"]
 
+# 数据文件 -> (mtime_ns, size, 行偏移列表, id -> 偏移)，进程内缓存
+_TEST_CASE_INDEX: Dict[str, tuple] = {}
+_TEST_CASE_INDEX_LOCK = threading.Lock()
+
+
+def _index_path(data_path: str) -> Path:
+    """索引文件与数据文件放在一起：xxx.jsonl -> xxx.jsonl.idx.json"""
+    return Path(str(data_path) + ".idx.json")
+
+
+def _build_test_case_index(data_path: str, mtime_ns: int, size: int) -> tuple:
+    """扫描一次 JSONL，记录每行的字节偏移以及 id -> 偏移，并尽量持久化到数据文件旁边。"""
+    line_offsets: List[int] = []
+    id_offsets: Dict[str, int] = {}
+    with open(data_path, "rb") as f:
+        offset = f.tell()
+        for line in iter(f.readline, b""):
+            line_offsets.append(offset)
+            if line.strip():
+                test_id = json.loads(line).get("id")
+                if test_id is not None:
+                    id_offsets.setdefault(str(test_id), offset)
+            offset = f.tell()
+
+    index_file = _index_path(data_path)
+    try:
+        tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"mtime_ns": mtime_ns, "size": size, "lines": line_offsets, "ids": id_offsets}, f)
+        os.replace(tmp_file, index_file)
+    except OSError as e:  # 数据目录只读时只保留内存索引
+        print(f"[BfclEnv] failed to persist test case index {index_file}: {e}")
+    return mtime_ns, size, line_offsets, id_offsets
+
+
+def _get_test_case_index(data_path: str) -> tuple:
+    """返回数据文件的偏移索引；数据文件的 mtime / 大小变化后索引自动失效重建。"""
+    key = os.path.abspath(data_path)
+    stat = os.stat(data_path)
+    with _TEST_CASE_INDEX_LOCK:
+        index = _TEST_CASE_INDEX.get(key)
+        if index is not None and index[:2] == (stat.st_mtime_ns, stat.st_size):
+            return index
+
+        index = None
+        try:
+            with open(_index_path(data_path), "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached.get("mtime_ns"), cached.get("size")) == (stat.st_mtime_ns, stat.st_size):
+                index = (stat.st_mtime_ns, stat.st_size, cached["lines"], cached["ids"])
+        except (OSError, ValueError, KeyError):
+            pass
+        if index is None:
+            index = _build_test_case_index(data_path, stat.st_mtime_ns, stat.st_size)
+        _TEST_CASE_INDEX[key] = index
+        return index
+
 
 def parse_assistant_content_to_tool_calls(msg: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -420,27 +478,29 @@ class BfclEnv(BaseEnv):
 
     @staticmethod
     def _load_test_case(data_path: str, test_id: str | None) -> Dict[str, Any]:
-        """按 ID / 行号加载单条 JSONL 测试用例。找不到就抛错。"""
+        """按 ID / 行号加载单条 JSONL 测试用例（通过字节偏移索引定位）。找不到就抛错。"""
         if not Path(data_path).exists():
             raise FileNotFoundError(f"BFCL data file '{data_path}' not found")
 
         if test_id is None:
             raise ValueError("task_id is required")
 
-        with open(data_path, "r", encoding="utf-8") as f:
-            if str(test_id).isdigit():
-                idx = int(test_id)
-                for line_no, line in enumerate(f):
-                    if line_no == idx:
-                        return json.loads(line)
+        _, _, line_offsets, id_offsets = _get_test_case_index(data_path)
+        if str(test_id).isdigit():
+            idx = int(test_id)
+            if idx >= len(line_offsets):
                 raise ValueError(f"Test case index {idx} not found in {data_path}")
-            else:
-                for line in f:
-                    data = json.loads(line)
-                    if data.get("id") == test_id:
-                        return data
+            offset = line_offsets[idx]
+        else:
+            offset = id_offsets.get(str(test_id))
+            if offset is None:
                 raise ValueError(f"Test case id '{test_id}' not found in {data_path}")
 
+        # 直接 seek 到目标行，避免每次创建实例都全量扫描 + json.loads
+        with open(data_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
     # 静态接口给 env_service 用
     @staticmethod
     def get_query_list(split: str = "train", params={"category": ["multi_turn_base"]}):
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import json
 import logging
 import os
 import shutil
+import threading
+import time
 import traceback
 from contextlib import AsyncExitStack
 from typing import Any
@@ -172,4 +175,127 @@ class MCPSessionHandler:
                     pass
             finally:
                 self.session = None
-                self.stdio_context = None
\ No newline at end of file
+                self.stdio_context = None
+
+class MCPSessionPool:
+    """Process-wide pool of initialized MCP sessions, keyed by server config.
+
+    All pooled sessions live on one background event loop, so a session
+    created for one environment instance can be borrowed by the next one
+    instead of spawning the server subprocess again. Tool listings are
+    cached per server config as well.
+    """
+
+    def __init__(self, max_idle_per_server: int = 8) -> None:
+        self.max_idle_per_server = max_idle_per_server
+        self._idle: dict[str, list[MCPSessionHandler]] = {}
+        self._tools: dict[str, list[Any]] = {}
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="mcp-session-pool", daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _key(name: str, config: dict[str, Any]) -> str:
+        return f"{name}:{json.dumps(config, sort_keys=True, default=str)}"
+
+    def run(self, coro, timeout: float | None = None) -> Any:
+        """Run a coroutine on the pool loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _open(self, name: str, config: dict[str, Any], max_retry: int) -> MCPSessionHandler:
+        for attempt in range(max_retry):
+            handler = MCPSessionHandler(name=name, config=config)
+            try:
+                await handler.initialize()
+                return handler
+            except Exception:
+                if attempt == max_retry - 1:
+                    raise
+                await asyncio.sleep(1)
+
+    def acquire(self, name: str, config: dict[str, Any], max_retry: int = 5) -> MCPSessionHandler:
+        """Borrow an initialized session, starting a new server only if none is idle.
+
+        Args:
+            name: Server name.
+            config: Server config from the ``mcpServers`` section.
+            max_retry: Attempts for starting a new server.
+
+        Returns:
+            An initialized MCPSessionHandler; give it back with ``release``.
+        """
+        key = self._key(name, config)
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                handler = idle.pop()
+                if handler.session is not None:
+                    return handler
+        return self.run(self._open(name, config, max_retry))
+
+    def release(self, name: str, config: dict[str, Any], handler: MCPSessionHandler) -> None:
+        """Return a borrowed session to the pool, or close it if the pool is full or the session is dead."""
+        if handler.session is not None:
+            key = self._key(name, config)
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_server:
+                    idle.append(handler)
+                    return
+        try:
+            self.run(handler.cleanup())
+        except Exception as e:
+            logging.warning(f"Error cleaning up server {name}: {e}")
+
+    def discard(self, handler: MCPSessionHandler) -> None:
+        """Close a borrowed session that should not be reused."""
+        try:
+            self.run(handler.cleanup())
+        except Exception as e:
+            logging.warning(f"Error cleaning up server {handler.name}: {e}")
+
+    def list_tools(self, name: str, config: dict[str, Any], max_retry: int = 5) -> list[Any]:
+        """Return the (cached) tool listing of a server.
+
+        The session opened for a cache miss goes back to the pool, so the
+        next environment instance reuses it.
+        """
+        key = self._key(name, config)
+        with self._lock:
+            tools = self._tools.get(key)
+        if tools is not None:
+            return tools
+
+        for attempt in range(max_retry):
+            handler = self.acquire(name, config, max_retry)
+            try:
+                tools = self.run(handler.list_tools())
+            except Exception:
+                self.discard(handler)
+                if attempt == max_retry - 1:
+                    raise
+                time.sleep(1)
+                continue
+            self.release(name, config, handler)
+            break
+        with self._lock:
+            self._tools[key] = tools
+        return tools
+
+
+_session_pool: MCPSessionPool | None = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> MCPSessionPool:
+    """Return the process-wide MCP session pool, creating it on first use."""
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = MCPSessionPool(
+                max_idle_per_server=int(os.getenv("MCP_POOL_MAX_IDLE", "8"))
+            )
+        return _session_pool
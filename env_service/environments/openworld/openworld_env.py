@@ -14,87 +14,16 @@ with open(config_path, 'r') as config_file:
     local_server_configs=server_configs
 
 
-import asyncio
-
-import threading
-import queue
-
 from typing import Dict
 
 from env_service.base import BaseEnv
 from env_service.registry import Registry
-from env_service.environments.openworld.mcp_utils import MCPSessionHandler
+from env_service.environments.openworld.mcp_utils import get_session_pool
 
 from env_service.environments.openworld.tool_call_extract import extract_tool_calls
 
 max_retry = 5
 
-class AsyncLoopThread:
-    def __init__(self):
-        self.loop = None
-        self.thread = threading.Thread(target=self._start_loop, daemon=True)
-        self.tasks = queue.Queue()
-        self.result_map = {}
-        self._stop_event = threading.Event()
-        self._worker_future = None
-        self.thread.start()
-
-        # 等待 loop 启动完成
-        while self.loop is None:
-            pass
-
-    def _start_loop(self):
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
-        self._worker_future = asyncio.ensure_future(self._worker())
-        try:
-            self.loop.run_forever()
-        finally:
-            pending = asyncio.all_tasks(self.loop)
-            for task in pending:
-                task.cancel()
-            try:
-                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            except Exception:
-                pass
-            self.loop.close()
-
-    async def _worker(self):
-        while not self._stop_event.is_set():
-            func, request_id, args, kwargs = await self.loop.run_in_executor(None, self.tasks.get)
-            try:
-                future = asyncio.ensure_future(func(*args, **kwargs))
-                result = await future
-                self.result_map[request_id] = result
-            except Exception as e:
-                self.result_map[request_id] = e
-
-    def run_async(self, func, *args, **kwargs):
-        request_id = id(func) + id(args) + id(kwargs)
-        self.tasks.put((func, request_id, args, kwargs))
-        while request_id not in self.result_map:
-            pass
-        result = self.result_map.pop(request_id)
-        if isinstance(result, Exception):
-            raise result
-        return result
-
-    def shutdown(self):
-        if self.loop is None or not self.loop.is_running():
-            return
-        self._stop_event.set()
-
-        # 等待 _worker 退出
-        def _stop():
-            if self._worker_future:
-                self._worker_future.cancel()
-            self.loop.stop()
-
-        self.loop.call_soon_threadsafe(_stop)
-        if self.thread.is_alive():
-            self.thread.join()
-
-
 
 @Registry.register("openworld")
 class OpenworldEnv(BaseEnv):
@@ -117,8 +46,8 @@ class OpenworldEnv(BaseEnv):
         self.server_handler_list = {}
         self.tool_to_server = {}
 
-        # 每个 Env 实例维护独立异步线程
-        self.async_thread = AsyncLoopThread()
+        # 进程内共享的 MCP 会话池：实例之间借用已启动的 server，而不是各自拉起子进程
+        self.session_pool = get_session_pool()
 
         self.system_prompt = """
         你具有以下工具，如果需要使用工具来辅助你回答问题，请按照下列格式，直接输出工具调用相关内容
@@ -138,12 +67,9 @@ class OpenworldEnv(BaseEnv):
         ----------
         """
 
-        # 同步阻塞初始化 tool_info
+        # 同步阻塞初始化 tool_info（按 server 配置缓存）
         if self.server_configs:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            self.tool_info = loop.run_until_complete(self._load_tool_info(self.server_configs))
-            loop.close()
+            self.tool_info = self._load_tool_info(self.server_configs)
 
 
         for server_name in self.tool_info:
@@ -158,38 +84,37 @@ class OpenworldEnv(BaseEnv):
                 """
 
 
-    async def _load_tool_info(self, server_configs):
+    def _load_tool_info(self, server_configs):
         all_tools = {}
         for server_name, config in server_configs["mcpServers"].items():
-            handler = MCPSessionHandler(name=server_name, config=config)
-            for attempt in range(max_retry):
-                try:
-                    await handler.initialize()
-                    tools = await handler.list_tools()
-                    all_tools[server_name] = tools
-                    await handler.cleanup()
-                    break
-                except Exception as e:
-                    if attempt == max_retry - 1:
-                        raise e
-                    await asyncio.sleep(1)
+            all_tools[server_name] = self.session_pool.list_tools(server_name, config, max_retry)
         return all_tools
 
-    async def _init_handlers(self):
+    def _init_handlers(self):
         handlers = {}
-        for server_name, config in self.server_configs["mcpServers"].items():
-            for attempt in range(max_retry):
-                try:
-                    handler = MCPSessionHandler(name=server_name, config=config)
-                    await handler.initialize()
-                    handlers[server_name] = handler
-                    break
-                except Exception as e:
-                    if attempt == max_retry - 1:
-                        raise e
-                    await asyncio.sleep(1)
+        try:
+            for server_name, config in self.server_configs["mcpServers"].items():
+                handlers[server_name] = self.session_pool.acquire(server_name, config, max_retry)
+        except Exception:
+            self._release_handlers(handlers)
+            raise
         return handlers
 
+    def _release_handlers(self, handlers):
+        for server_name, handler in handlers.items():
+            self.session_pool.release(server_name, self.server_configs["mcpServers"][server_name], handler)
+
+    def _replace_handler(self, server_name):
+        # 调用失败后会话可能已损坏：直接关闭而不是归还给池，并借用一个新的会话
+        handler = self.server_handler_list.pop(server_name, None)
+        if handler is not None:
+            self.session_pool.discard(handler)
+        try:
+            self.server_handler_list[server_name] = self.session_pool.acquire(
+                server_name, self.server_configs["mcpServers"][server_name], max_retry)
+        except Exception:
+            pass
+
     async def _call_tool(self, handler, tool_name, tool_args):
         return await handler.call_tool(tool_name=tool_name, arguments=tool_args)
 
@@ -197,10 +122,8 @@ class OpenworldEnv(BaseEnv):
         query = '帮我查询一下宁德时代的股票，在今天是否值得购买' \
             if self.instance_id == '0' else '我想知道匠心家具最近为什么涨这么多，请帮我分析一下'
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        self.server_handler_list = loop.run_until_complete(self._init_handlers())
-        loop.close()
+        self._release_handlers(self.server_handler_list)
+        self.server_handler_list = self._init_handlers()
 
 
         return {
@@ -219,15 +142,15 @@ class OpenworldEnv(BaseEnv):
         if action_msg and action_msg["tool_name"] in self.tool_to_server and self.server_handler_list:
             server_name = self.tool_to_server[action_msg["tool_name"]]
             try:
-                tool_result = self.async_thread.run_async(
-                    self._call_tool,
+                tool_result = self.session_pool.run(self._call_tool(
                     self.server_handler_list[server_name],
                     action_msg["tool_name"],
                     action_msg["tool_args"]
-                )
+                ))
                 tool_results = "".join([txt.text for txt in tool_result.content]) if tool_result else "Tool returned no content."
             except Exception:
                 tool_results = f'Failed to call tool {action_msg["tool_name"]} with params {action_msg["tool_args"]}'
+                self._replace_handler(server_name)
         else:
             if not action_msg:
                 name_in_msg = any(tool_name in content_msg for tool_name in self.tool_to_server)
@@ -267,14 +190,12 @@ class OpenworldEnv(BaseEnv):
         }
 
     def close(self):
-        async def _cleanup_all():
-            for handler in self.server_handler_list.values():
-                await handler.cleanup()
+        # 会话归还给进程内的池，供下一个实例复用
         try:
-            self.async_thread.run_async(_cleanup_all)
+            self._release_handlers(self.server_handler_list)
         except Exception:
             pass
-        self.async_thread.shutdown()
+        self.server_handler_list = {}
 
     def evaluate(self, messages: Dict = {}, params={}) -> float:
         return 0.0
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+In-process request metrics for the env service.
+
+Keeps request counters and latency histograms labelled by endpoint,
+env type and outcome, and renders them (together with gauges supplied
+at scrape time) in the Prometheus text exposition format, so no
+external metrics server or client library is needed.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Render a label dict as ``{k="v",...}``."""
+    if not labels:
+        return ""
+    items = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        items.append(f'{key}="{value}"')
+    return "{" + ",".join(items) + "}"
+
+
+class ServiceMetrics:
+    """
+    Thread-safe request counters and latency histograms.
+
+    Every observation is keyed by (endpoint, env_type, status), where
+    status is ``ok``, ``bad_request`` (ValueError, answered with 400)
+    or ``error``. Batch requests in which some items failed are recorded
+    as ``partial``, and their items are counted separately.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        Initialize empty metrics.
+
+        Args:
+            buckets (Iterable[float]): Upper bounds of the latency
+                histogram buckets in seconds.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str, str], int] = {}
+        # (endpoint, env_type) -> [bucket counts..., +Inf count, sum]
+        self._histograms: Dict[Tuple[str, str], List[float]] = {}
+        # per-item outcomes of batch requests, keyed like _counts
+        self._item_counts: Dict[Tuple[str, str, str], int] = {}
+
+    @staticmethod
+    def classify(error: Optional[BaseException]) -> str:
+        """Status label of an outcome: ``ok``, ``bad_request`` or ``error``."""
+        if error is None:
+            return "ok"
+        if isinstance(error, ValueError):
+            return "bad_request"
+        return "error"
+
+    def observe(
+        self,
+        endpoint: str,
+        env_type: str,
+        status: str,
+        seconds: float,
+    ) -> None:
+        """
+        Record one finished request.
+
+        Args:
+            endpoint (str): The endpoint name, e.g. ``step``.
+            env_type (str): The env type the request was served by.
+            status (str): The outcome of the request.
+            seconds (float): The request latency.
+        """
+        env_type = env_type or "unknown"
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            key = (endpoint, env_type, status)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            hist = self._histograms.get((endpoint, env_type))
+            if hist is None:
+                hist = [0] * (len(self.buckets) + 1) + [0.0]
+                self._histograms[(endpoint, env_type)] = hist
+            hist[idx] += 1
+            hist[-1] += seconds
+
+    def observe_items(
+        self,
+        endpoint: str,
+        env_types: List[str],
+        results: List[Any],
+    ) -> bool:
+        """
+        Count the per-item outcomes of a batch request.
+
+        Args:
+            endpoint (str): The endpoint name, e.g. ``batch_step``.
+            env_types (List[str]): The env type of each item.
+            results (List[Any]): The result of each item; exceptions
+                mark failed items.
+
+        Returns:
+            bool: True if any item failed.
+        """
+        failed = False
+        with self._lock:
+            for env_type, result in zip(env_types, results):
+                error = result if isinstance(result, BaseException) else None
+                failed = failed or error is not None
+                key = (endpoint, env_type or "unknown", self.classify(error))
+                self._item_counts[key] = self._item_counts.get(key, 0) + 1
+        return failed
+
+    @contextmanager
+    def track(self, endpoint: str, env_type: str):
+        """
+        Time the wrapped block and record it, classifying exceptions.
+
+        The block may set ``outcome["status"]`` to record a status other
+        than ``ok`` for a request that did not raise.
+
+        Args:
+            endpoint (str): The endpoint name.
+            env_type (str): The env type the request was served by.
+        """
+        start = time.perf_counter()
+        outcome: Dict[str, str] = {}
+        status = "ok"
+        try:
+            yield outcome
+            status = outcome.get("status", status)
+        except BaseException as e:
+            status = self.classify(e)
+            raise
+        finally:
+            self.observe(
+                endpoint,
+                env_type,
+                status,
+                time.perf_counter() - start,
+            )
+
+    def render(
+        self,
+        gauges: Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]] = None,
+    ) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+
+        Args:
+            gauges: Extra gauges computed at scrape time, as
+                ``name -> (help, {label items: value})``.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            item_counts = dict(self._item_counts)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = [
+            "# HELP env_service_requests_total Requests handled, by endpoint, env type and status.",
+            "# TYPE env_service_requests_total counter",
+        ]
+        for (endpoint, env_type, status), value in sorted(counts.items()):
+            labels = _format_labels(
+                {"endpoint": endpoint, "env_type": env_type, "status": status},
+            )
+            lines.append(f"env_service_requests_total{labels} {value}")
+
+        lines += [
+            "# HELP env_service_batch_items_total Items of batch requests, by endpoint, env type and status.",
+            "# TYPE env_service_batch_items_total counter",
+        ]
+        for (endpoint, env_type, status), value in sorted(item_counts.items()):
+            labels = _format_labels(
+                {"endpoint": endpoint, "env_type": env_type, "status": status},
+            )
+            lines.append(f"env_service_batch_items_total{labels} {value}")
+
+        lines += [
+            "# HELP env_service_request_duration_seconds Request latency, by endpoint and env type.",
+            "# TYPE env_service_request_duration_seconds histogram",
+        ]
+        for (endpoint, env_type), hist in sorted(histograms.items()):
+            base = {"endpoint": endpoint, "env_type": env_type}
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), hist[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels({**base, "le": le})
+                lines.append(
+                    f"env_service_request_duration_seconds_bucket{labels} {cumulative}",
+                )
+            labels = _format_labels(base)
+            lines.append(
+                f"env_service_request_duration_seconds_sum{labels} {hist[-1]}",
+            )
+            lines.append(
+                f"env_service_request_duration_seconds_count{labels} {cumulative}",
+            )
+
+        for name, (help_text, samples) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for label_items, value in sorted(samples.items()):
+                lines.append(f"{name}{_format_labels(dict(label_items))} {value}")
+
+        lines += [
+            "# HELP env_service_uptime_seconds Seconds since the service started.",
+            "# TYPE env_service_uptime_seconds gauge",
+            f"env_service_uptime_seconds {time.time() - self.start_time}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,87 @@
+"""
+Numerical equivalence of the vectorized ADCA-GRPO step reward schemes
+against the loop-based reference in adca_grpo_reference.py.
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from agentevolver.module.adv_processor import adca_grpo, adca_grpo_reference
+from agentevolver.module.adv_processor.adca_grpo import PRMHyper
+
+
+def _make_batch(seed: int, B: int = 12, L: int = 40, n_groups: int = 3):
+    rng = random.Random(seed)
+    step_ids = torch.full((B, L), -1, dtype=torch.long)
+    step_flags = []
+    rewards = torch.zeros((B, L), dtype=torch.float32)
+    for i in range(B):
+        K = rng.choice([0, 1, 2, 3, 5, 8])
+        pos = rng.randint(0, 3)
+        for k in range(K):
+            n_tok = rng.randint(1, 4)
+            step_ids[i, pos:pos + n_tok] = k
+            pos += n_tok + rng.randint(0, 1)
+        # Flags may be shorter or longer than K, exercising the alignment
+        n_flags = max(0, K + rng.choice([-2, -1, 0, 0, 1]))
+        step_flags.append([rng.random() < 0.5 for _ in range(n_flags)])
+        rewards[i, L - 1] = rng.choice([0.0, 1.0, rng.random()])
+    group_ids = torch.tensor([rng.randrange(n_groups) for _ in range(B)], dtype=torch.long)
+    batch = SimpleNamespace(batch={
+        "responses": torch.zeros((B, L), dtype=torch.long),
+        "step_ids": step_ids,
+        "group_ids": group_ids,
+        "token_level_rewards": rewards,
+    })
+    return batch, step_flags
+
+
+HYPERS = [
+    PRMHyper(),
+    PRMHyper(equal_trajectory_weight=False),
+    PRMHyper(orm_distribution="all_steps", alpha=0.5),
+    PRMHyper(do_batch_norm=False, enable_length_normalization=True),
+]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("hyper", HYPERS)
+@pytest.mark.parametrize("scheme", ["allocation", "decouple"])
+def test_matches_reference(seed, hyper, scheme):
+    batch, step_flags = _make_batch(seed)
+    got = adca_grpo.compute_prm_grpo_advantages(batch, step_flags, hyper=hyper, scheme=scheme)
+    want = adca_grpo_reference.compute_prm_grpo_advantages_reference(batch, step_flags, hyper=hyper, scheme=scheme)
+
+    torch.testing.assert_close(got["advantages"], want["advantages"], rtol=1e-5, atol=1e-5)
+    assert got["metrics"].keys() == want["metrics"].keys()
+    for key, value in want["metrics"].items():
+        assert got["metrics"][key] == pytest.approx(value, rel=1e-4, abs=1e-5), key
+
+
+def test_only_prm_decouple_matches_reference():
+    batch, step_flags = _make_batch(7)
+    hyper = PRMHyper(orm_distribution="only_prm")
+    got = adca_grpo.compute_prm_grpo_advantages(batch, step_flags, hyper=hyper, scheme="decouple")
+    want = adca_grpo_reference.compute_prm_grpo_advantages_reference(batch, step_flags, hyper=hyper, scheme="decouple")
+    torch.testing.assert_close(got["advantages"], want["advantages"], rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("equal_trajectory_weight", [True, False])
+def test_group_zscore_matches_reference(equal_trajectory_weight):
+    batch, step_flags = _make_batch(3)
+    hyper = PRMHyper(equal_trajectory_weight=equal_trajectory_weight)
+    rng = random.Random(0)
+    raw = [[rng.uniform(-1, 1) for _ in flags] for flags in step_flags]
+    K_max = max((len(r) for r in raw), default=0)
+    padded = torch.tensor([r + [0.0] * (K_max - len(r)) for r in raw], dtype=torch.float64)
+    mask = torch.arange(K_max).unsqueeze(0) < torch.tensor([len(r) for r in raw]).unsqueeze(1)
+    group_ids = batch.batch["group_ids"]
+
+    got = adca_grpo._group_zscore_on_steps(padded, mask, group_ids, hyper)
+    want = adca_grpo_reference._group_zscore_on_steps(raw, group_ids, hyper)
+    for i, row in enumerate(want):
+        assert got[i, :len(row)].tolist() == pytest.approx(row, rel=1e-9, abs=1e-9)
+        assert not got[i, len(row):].any()
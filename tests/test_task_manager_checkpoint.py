@@ -0,0 +1,88 @@
+"""
+GenerationJournal: replay, torn records, hash mismatch and legacy conversion.
+"""
+import json
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from agentevolver.module.task_manager.checkpoint import GenerationJournal
+from agentevolver.schema.task import Task, TaskObjective
+
+
+def _objective(query: str, confidence: float = 1.0) -> TaskObjective:
+    return TaskObjective(task=Task(task_id="t0", open_query=False, query=query), confidence=confidence)
+
+
+def test_replays_appended_records(tmp_path):
+    path = str(tmp_path / "ckpt.jsonl")
+    journal = GenerationJournal(path, "hash", total_items=4)
+    assert journal.load() == (set(), [])
+    journal.append([0], [_objective("a")])
+    journal.append([2], [_objective("b"), _objective("c")])
+    journal.close()
+
+    items, objectives = GenerationJournal(path, "hash", total_items=4).load()
+    assert items == {0, 2}
+    assert [o.objective for o in objectives] == ["a", "b", "c"]
+
+
+def test_drops_torn_trailing_record(tmp_path):
+    path = str(tmp_path / "ckpt.jsonl")
+    journal = GenerationJournal(path, "hash", total_items=4)
+    journal.load()
+    journal.append([0], [_objective("a")])
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"items": [1], "objectives": [{"task"')  # crash in the middle of a write
+
+    journal = GenerationJournal(path, "hash", total_items=4)
+    items, objectives = journal.load()
+    assert items == {0}
+    assert [o.objective for o in objectives] == ["a"]
+
+    # the torn bytes are cut off, so the next record lands on its own line
+    journal.append([1], [_objective("b")])
+    journal.close()
+    items, objectives = GenerationJournal(path, "hash", total_items=4).load()
+    assert items == {0, 1}
+    assert [o.objective for o in objectives] == ["a", "b"]
+
+
+def test_hash_mismatch_starts_afresh(tmp_path):
+    path = str(tmp_path / "ckpt.jsonl")
+    journal = GenerationJournal(path, "old-hash", total_items=4)
+    journal.load()
+    journal.append([0, 1], [_objective("a")])
+    journal.close()
+
+    journal = GenerationJournal(path, "new-hash", total_items=4)
+    assert journal.load() == (set(), [])
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1 and json.loads(lines[0])["tasks_hash"] == "new-hash"
+
+
+@pytest.mark.parametrize("in_place", [True, False])
+def test_converts_legacy_checkpoint(tmp_path, in_place):
+    legacy_path = str(tmp_path / "ckpt.json")
+    with open(legacy_path, "w") as f:
+        json.dump({
+            "tasks_hash": "hash",
+            "processed_indices": [1],
+            "results": [_objective("a").dict()],
+        }, f)
+    path = legacy_path if in_place else str(tmp_path / "ckpt.jsonl")
+
+    journal = GenerationJournal(path, "hash", total_items=5)
+    items, objectives = journal.load(legacy_batch_size=2, legacy_path=None if in_place else legacy_path)
+    journal.close()
+    assert items == {2, 3}
+    assert [o.objective for o in objectives] == ["a"]
+
+    # the converted journal replays without the legacy file
+    items, objectives = GenerationJournal(path, "hash", total_items=5).load()
+    assert items == {2, 3}
+    assert [o.objective for o in objectives] == ["a"]
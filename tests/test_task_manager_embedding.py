@@ -8,7 +8,7 @@ from unittest.mock import patch
 
 # 导入你的实际模块
 from agentevolver.client.embedding_client import OpenAIEmbeddingClient
-from agentevolver.module.task_manager.strategies.deduplication.embedding import EmbeddingClient,StateRecorder,pack_trajectory
+from agentevolver.module.task_manager.strategies.deduplication.embedding import EmbeddingBatcher,EmbeddingCache,EmbeddingClient,StateRecorder,pack_trajectory
 
 
 class MockTrajectory:
@@ -455,6 +455,87 @@ class TestRealAPIPerformance:
         assert len(batch_embeddings) == len(texts)
 
 
+class TestEmbeddingCache:
+    """EmbeddingCache 离线测试（无需API）"""
+
+    def test_lru_and_persistence(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        cache = EmbeddingCache(path, model="m", max_memory_items=1)
+        assert cache.get_many(["a", "b"]) == [None, None]
+
+        cache.put_many(["a", "b"], [[0.5, 1.0], [0.25, -1.0]])
+        # "a" was evicted from memory but is still served from disk
+        assert cache.get_many(["a", "b", "a"]) == [[0.5, 1.0], [0.25, -1.0], [0.5, 1.0]]
+        cache.close()
+
+        reopened = EmbeddingCache(path, model="m")
+        assert reopened.get_many(["b"]) == [[0.25, -1.0]]
+        # the model name is part of the key
+        assert EmbeddingCache(path, model="other").get_many(["b"]) == [None]
+
+    def test_client_only_embeds_misses(self, tmp_path):
+        calls = []
+
+        def fake_embeddings(texts):
+            calls.append(list(texts))
+            return [[float(len(t)), 1.0] for t in texts]
+
+        client = EmbeddingClient(similarity_threshold=0.9, api_key="dummy", chroma_db_path=str(tmp_path))
+        with patch.object(client._client, "get_multiple_embeddings", side_effect=fake_embeddings):
+            assert client._embedding(["ab", "abc", "ab"]) == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+            assert client._get_embedding("abc") == [3.0, 1.0]
+        assert calls == [["ab", "abc"]]
+
+        client.close()
+        assert not client._batcher._dispatcher.is_alive()
+
+
+class TestEmbeddingBatcher:
+    """EmbeddingBatcher 离线测试（无需API）"""
+
+    def test_concurrent_calls_share_requests(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        calls = []
+
+        def fake_embeddings(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        batcher = EmbeddingBatcher(fake_embeddings, max_batch_size=8, max_wait=0.05)
+        texts = [f"text-{i % 16}" for i in range(32)]
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda t: batcher.submit([t])[0].result(timeout=5), texts))
+        batcher.close()
+
+        assert results == [[float(len(t))] for t in texts]
+        assert {t for batch in calls for t in batch} == set(texts)
+        assert all(len(batch) <= 8 for batch in calls)
+        assert len(calls) < len(texts)
+
+    def test_leftover_keeps_its_arrival_time(self):
+        batcher = EmbeddingBatcher(lambda texts: [[0.0] for _ in texts], max_batch_size=4, max_wait=0.5)
+        # hold the dispatcher off while all five texts arrive, so the flush of a-d comes 0.3s after e arrived
+        with batcher._cond:
+            futures = batcher.submit(["a", "b", "c", "d", "e"])
+            time.sleep(0.3)
+        flushed = time.monotonic()
+        futures[-1].result(timeout=5)
+        # e leaves max_wait after its own arrival (~0.2s after the flush), not a full max_wait after the flush
+        assert time.monotonic() - flushed < 0.4
+        batcher.close()
+
+    def test_failure_propagates_to_callers(self):
+        def failing(texts):
+            raise RuntimeError("boom")
+
+        batcher = EmbeddingBatcher(failing, max_wait=0.0)
+        future, = batcher.submit(["a"])
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+        batcher.close()
+
+
 # 运行配置和说明
 class TestConfiguration:
     """测试配置和环境检查"""